@@ -1,23 +1,49 @@
+import time
 import logging
 from collections import Counter
+from itertools import islice
 from app.config import Config
+from app.check_runner import CheckRunner
+from app.http_session import SessionPool
 from app.logger_setup import LoggerSetup
+from app.metrics import Metrics, MetricsExporter
 from app.report_manager import ReportManager
 from app.sitemap_crawler import SitemapCrawler
-from app.url_checker import UrlChecker
+from app.sharding import filter_shard
+from app.url_cache import UrlCache
 
 class SitemapCheckerApp:
-    """Main application controller."""
-    def __init__(self, sitemap_url, resume=False):
-        self.config = Config(sitemap_url, resume)
+    """Main application controller.
+
+    A multi-root run passes its shared session_pool and metrics and sets up
+    logging itself (setup_logging=False).
+    """
+    def __init__(self, sitemap_url, resume=False, session_pool=None, metrics=None, setup_logging=True,
+                 **config_options):
+        self.config = Config(sitemap_url, resume, **config_options)
         self.report_manager = ReportManager(self.config)
-        self.crawler = SitemapCrawler()
+        self.session_pool = session_pool or SessionPool.from_config(self.config)
+        self.metrics = metrics or Metrics()
+        self.metrics.add_gauge("report_writer_queue_depth", "Results waiting for the report writer.",
+                               self.report_manager.queue_depth)
+        self.crawler = SitemapCrawler(
+            self.session_pool,
+            num_workers=self.config.crawl_workers,
+            queue_size=self.config.crawl_queue_size,
+            metrics=self.metrics,
+            snapshot_path=self.config.crawl_snapshot_file
+        )
+        # Stored results reference each page's sitemap through the crawl tree
+        self.report_manager.set_sitemap_tree(self.crawler.tree)
 
         # 1. Clean up if needed
         self.report_manager.prepare_environment()
 
         # 2. Setup logging
-        LoggerSetup.setup(self.config)
+        if setup_logging:
+            LoggerSetup.setup(self.config)
+
+        self.unchanged_skipped = 0
 
         self._announce_mode()
 
@@ -26,46 +52,111 @@ class SitemapCheckerApp:
             msg = "RESUME RUN DETECTED. Continuing from previous state."
         else:
             msg = "NEW RUN STARTED. Previous reports and logs cleared."
+        if self.config.root_name:
+            msg += f" Root {self.config.sitemap_url} ({self.config.reports_dir})."
+        if self.config.is_sharded:
+            msg += f" Shard {self.config.shard_index}/{self.config.shard_count} ({self.config.reports_dir})."
         print(f"\n{msg}\n")
         logging.info(msg)
 
     def run(self):
-        # 1. Crawl Sitemaps
-        all_urls_with_path, dead_sitemaps, levels, max_depth = self.crawler.fetch_all(self.config.sitemap_url)
-
-        # Set max_depth in report_manager for proper column generation
-        self.report_manager.set_max_depth(max_depth)
-
-        if self.config.limit_requests:
-            all_urls_with_path = all_urls_with_path[:self.config.limit_requests]
-            logging.info('Requests capped at: %d', len(all_urls_with_path))
-
-        # 2. Load Previous State
-        checked_urls_set, existing_statuses = self.report_manager.load_checked_urls()
-
-        # 3. Calculate urls needed to check (filter by URL, keep path info)
-        urls_to_check = [(url, path) for url, path in all_urls_with_path if url not in checked_urls_set]
+        urls_to_check = self.pending_checks()
 
         # 4. Check URLs
-        if urls_to_check:
-            new_results = UrlChecker.check_urls(
-                urls_to_check,
-                start_index=len(checked_urls_set),
-                report_manager=self.report_manager
-            )
-            existing_statuses.extend(new_results)
-        else:
+        self.report_manager.start_writer()
+        exporter = MetricsExporter.from_config(self.metrics, self.config).start()
+        try:
+            checked = self._check(urls_to_check)
+        finally:
+            # Persist every result checked so far, also when the run is interrupted
+            self.report_manager.close()
+            exporter.stop()
+        self.metrics.log_summary()
+        if self.config.incremental:
+            msg = f"Incremental run: {self.unchanged_skipped} unchanged URLs taken from the cache"
+            print(msg)
+            logging.info(msg)
+        if not checked and not self.unchanged_skipped:
             msg = "All URLs have already been checked."
             print(msg)
             logging.info(msg)
 
         # 5. Summarize and Final Export
-        self._summarize(existing_statuses)
-        self.report_manager.export_dead_sitemaps(dead_sitemaps)
-        self.report_manager.export_sitemap_levels(levels)
+        self.session_pool.log_stats()
+        self.session_pool.close()
+        self._summarize(self.report_manager.status_counts())
+        self.export_reports()
+
+    def pending_checks(self):
+        """Loads the run state and returns the lazy stream of URLs that still need a request."""
+        # 1. Load Previous State
+        self.report_manager.load_checked_urls()
+
+        # 2. Crawl Sitemaps; page URLs stream into the checker while the crawl continues.
+        #    A resumed run replays the recorded crawl instead.
+        all_urls_with_path = self.crawler.stream(
+            self.config.sitemap_url, resume=self.config.resume, revalidate=self.config.revalidate_sitemaps
+        )
+
+        if self.config.is_sharded:
+            # Every shard crawls the full tree but checks only its share of the page URLs
+            all_urls_with_path = filter_shard(all_urls_with_path, self.config.shard_index, self.config.shard_count)
+            logging.info('Shard %d of %d', self.config.shard_index, self.config.shard_count)
+
+        if self.config.limit_requests:
+            all_urls_with_path = islice(all_urls_with_path, self.config.limit_requests)
+            logging.info('Requests capped at: %d', self.config.limit_requests)
+
+        # 3. Calculate urls needed to check (filter by URL, keep sitemap node id)
+        return self._pending_urls(all_urls_with_path)
+
+    def export_reports(self):
+        """Writes the final CSV reports once every result is stored, and closes the run state."""
+        # The crawl has finished, so the final depth is known for the sitemap level columns
+        self.report_manager.set_max_depth(self.crawler.max_depth)
+        self.report_manager.export_check_reports()
+        self.report_manager.export_dead_sitemaps(self.crawler.inaccessible_sitemaps)
+        self.report_manager.export_sitemap_levels(self.crawler.sitemap_levels)
+        self.report_manager.export_sitemap_rollup()
+        self.report_manager.close_store()
+
+    def _pending_urls(self, page_urls):
+        """Yields (url, node_id, lastmod, cache_entry) for URLs that still need a request.
+
+        Each unique URL is claimed once; repeats and URLs stored by a resumed
+        run are recorded by the ReportManager instead. In incremental mode, URLs
+        that are unchanged and recently healthy are recorded from the cache, and
+        the others carry their cache entry for a conditional request.
+        """
+        ttl = self.config.cache_ttl
+        now = time.time()
+        for url, node_id, lastmod in page_urls:
+            if not self.report_manager.claim_url(url, node_id):
+                continue
+            cached = self.report_manager.cached_result(url) if self.config.incremental else None
+            if UrlCache.can_skip(cached, lastmod, ttl, now):
+                self.report_manager.append_cached_result(url, node_id, cached)
+                self.unchanged_skipped += 1
+                continue
+            yield url, node_id, lastmod, cached
+
+    def _check(self, urls_to_check):
+        """Runs the configured check engine; returns the number of URLs checked."""
+        runner = CheckRunner(self.config, self.session_pool, self.metrics)
+        try:
+            return runner.run(urls_to_check, self.report_manager)
+        finally:
+            self.log_deduplication(self.report_manager.deduplicator.duplicates, runner.redirect_cache.hits)
+
+    @staticmethod
+    def log_deduplication(duplicates, redirect_hits):
+        msg = (f"Deduplication: {duplicates} repeated URLs reused a result, "
+               f"{redirect_hits} redirects resolved from the redirect cache")
+        print(msg)
+        logging.info(msg)
 
-    def _summarize(self, statuses):
-        counts = Counter(status for _, status, *_ in statuses)
+    def _summarize(self, status_counts):
+        counts = Counter(status_counts)
         print("\nSummary of HTTP status codes:")
         for status, count in sorted(counts.items()):
             print(f"Status {status}: {count} URLs")
@@ -78,25 +169,26 @@ class SitemapCheckerApp:
 
     @staticmethod
     def can_resume():
-        """Check if a resume is possible (previous report exists)."""
+        """Check if a resume is possible (previous run state exists)."""
         import os
-        return os.path.exists("reports/url_checks.csv")
+        return os.path.exists(Config(None).state_db)
 
     @staticmethod
     def get_resume_info():
         """Get information about the previous run for resume."""
         import os
-        import csv
+        from app.state_store import StateStore
 
-        csv_path = "reports/url_checks.csv"
-        if not os.path.exists(csv_path):
+        state_db = Config(None).state_db
+        if not os.path.exists(state_db):
             return None
 
         try:
-            with open(csv_path, "r", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                next(reader, None)  # Skip header
-                count = sum(1 for _ in reader)
-            return count
+            store = StateStore(state_db)
+            try:
+                # Row count is kept in the store's metadata; no table scan
+                return store.checked_count()
+            finally:
+                store.close()
         except Exception:
             return None
\ No newline at end of file
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import aiohttp
+from urllib.parse import urljoin
+from tqdm import tqdm
+from yarl import URL
+from app.circuit_breaker import CircuitOpenError
+from app.retry import RetryPolicy
+from app.host_limiter import CONGESTION_STATUSES, host_of, retry_after_of
+from app.logger_setup import log_check
+from app.metrics import Metrics
+from app.request_method import RequestMethodSelector
+from app.url_dedup import RedirectCache
+from app.url_normalizer import canonical_url
+
+MAX_REDIRECTS = 30
+# Errors that mean the host could not be reached at all (for the circuit breaker)
+CONNECTION_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+TLS_ERRORS = (aiohttp.ClientSSLError,)
+# RetryPolicy error kinds; TLS errors are also connector errors, so they come first
+ERROR_KINDS = (
+    ("tls", TLS_ERRORS),
+    ("timeout", (asyncio.TimeoutError,)),
+    ("connection", (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError)),
+)
+REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+
+
+def _as_sent(target):
+    """A redirect target to request exactly as the server sent it (aiohttp would requote %2F, %3F, ...)."""
+    if target.isascii() and not any(char.isspace() for char in target):
+        return URL(target, encoded=True)
+    return target
+
+class AsyncUrlChecker:
+    """Performs HTTP checks on URLs from a single asyncio event loop."""
+    @staticmethod
+    def check_urls(urls_to_check, report_manager, max_in_flight=500, keepalive_timeout=30, retry_policy=None,
+                   host_controller=None, redirect_cache=None, metrics=None, circuit_breaker=None, dns_cache_ttl=300,
+                   method_selector=None, drain_bytes=65536):
+        """Checks (url, node_id, lastmod, cache_entry) items; a cache entry makes the request conditional.
+
+        Results go to report_manager.append_check_result; returns how many were reported.
+        """
+        retry_policy = retry_policy or RetryPolicy(error_kinds=ERROR_KINDS)
+        redirect_cache = redirect_cache or RedirectCache()
+        metrics = metrics or Metrics()
+        method_selector = method_selector or RequestMethodSelector()
+        return asyncio.run(
+            AsyncUrlChecker._check_all(
+                urls_to_check, report_manager, max_in_flight, keepalive_timeout, retry_policy, host_controller,
+                redirect_cache, metrics, circuit_breaker, dns_cache_ttl, method_selector, drain_bytes
+            )
+        )
+
+    @staticmethod
+    def _connection_tracing(counts):
+        """Counts new vs reused pooled connections for the reuse ratio."""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_create(session, context, params):
+            counts["new"] += 1
+
+        async def on_reuse(session, context, params):
+            counts["reused"] += 1
+
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    @staticmethod
+    async def _drain(resp, limit):
+        """Reads at most limit body bytes and returns the body bytes received.
+
+        A body that fits is read to the end, so the connection goes back to the
+        pool; a longer one is abandoned and its connection closed.
+        """
+        if resp.method != "HEAD":
+            if resp.content_length is None or resp.content_length <= limit:
+                while not resp.content.at_eof() and resp.content.total_bytes <= limit:
+                    if not await resp.content.readany():
+                        break
+            if not resp.content.at_eof():
+                resp.close()
+        return resp.content.total_bytes
+
+    @staticmethod
+    async def _check_all(urls_to_check, report_manager, max_in_flight, keepalive_timeout,
+                         retry_policy, host_controller, redirect_cache, metrics, circuit_breaker, dns_cache_ttl,
+                         method_selector, drain_bytes):
+        checked = 0
+        print(f"Checking all page URLs (async, up to {max_in_flight} in flight)...")
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_in_flight)
+        connector = aiohttp.TCPConnector(
+            limit=max_in_flight, keepalive_timeout=keepalive_timeout, use_dns_cache=dns_cache_ttl > 0,
+            ttl_dns_cache=dns_cache_ttl or None
+        )
+        connection_counts = {"new": 0, "reused": 0}
+        trace_configs = [AsyncUrlChecker._connection_tracing(connection_counts)]
+
+        async with aiohttp.ClientSession(connector=connector, trace_configs=trace_configs) as session:
+
+            async def check_single(item):
+                url, node_id, lastmod, cached = item
+                headers = cached.conditional_headers() if cached else None
+
+                async def attempt_request(attempt):
+                    host = host_of(url)
+                    if circuit_breaker is not None and not circuit_breaker.allow(host):
+                        return 0, circuit_breaker.open_error(host), None, None
+                    if host_controller is not None:
+                        # Wait for a slot under the host's current concurrency / rate limit
+                        await host_controller.acquire_async(host)
+                    status_code, error, response_headers, latency, body_bytes = await send_request(attempt, host)
+                    log_check(url, node_id, attempt, status_code, error, latency, body_bytes)
+                    if circuit_breaker is not None:
+                        circuit_breaker.record(host, error)
+                    if host_controller is not None:
+                        await host_controller.release_async(
+                            host, status_code, error, latency, retry_after_of(status_code, response_headers)
+                        )
+                    return status_code, error, response_headers, latency
+
+                async def send_request(attempt, host):
+                    # Hold a slot only while the request is in flight, not while backing off
+                    async with semaphore:
+                        metrics.request_started()
+                        started = loop.time()
+                        status_code, error, response_headers, body_bytes = await check(attempt, host)
+                        latency = loop.time() - started
+                        metrics.request_finished(host, latency, body_bytes)
+                        return status_code, error, response_headers, latency, body_bytes
+
+                async def check(attempt, host):
+                    """Returns (status, error, response headers, body bytes downloaded)."""
+                    body_bytes = 0
+                    # A retry must reach the server; the cache could only repeat an earlier answer
+                    use_cache = attempt == 0
+                    try:
+                        client_timeout = aiohttp.ClientTimeout(total=retry_policy.timeout_for(attempt))
+                        method = method_selector.method_for(host)
+                        status_code, response_headers, body_bytes = await fetch(method, client_timeout, use_cache)
+                        if method == "HEAD" and method_selector.needs_get(status_code):
+                            head_status = status_code
+                            status_code, response_headers, get_bytes = await fetch("GET", client_timeout, use_cache)
+                            body_bytes += get_bytes
+                            method_selector.record_fallback(host, head_status, status_code)
+                        return status_code, None, response_headers, body_bytes
+                    except Exception as e:
+                        return 0, e, None, body_bytes
+
+                async def fetch(method, client_timeout, use_cache):
+                    """Follows redirects by hand so final statuses of common targets are fetched only once.
+
+                    Bodies are read up to drain_bytes; returns (status, headers, body bytes).
+                    """
+                    targets = []
+                    body_bytes = 0
+                    target, request_headers = url, headers
+                    while True:
+                        async with session.request(
+                            method,
+                            target,
+                            allow_redirects=False,
+                            headers=request_headers,
+                            timeout=client_timeout,
+                        ) as resp:
+                            body_bytes += await AsyncUrlChecker._drain(resp, drain_bytes)
+                            status_code, response_headers = resp.status, resp.headers
+                            location = resp.headers.get("Location")
+                            current = str(resp.url)
+                        if status_code not in REDIRECT_STATUSES or not location:
+                            break
+                        if len(targets) >= MAX_REDIRECTS:
+                            raise aiohttp.TooManyRedirects(resp.request_info, ())
+                        # Fetched as sent; only the cache key is canonicalized
+                        target = urljoin(current, location)
+                        key = canonical_url(target)
+                        known_status = redirect_cache.get(key) if use_cache else None
+                        if known_status is not None:
+                            redirect_cache.put_all(targets, known_status)
+                            return known_status, None, body_bytes
+                        targets.append(key)
+                        target = _as_sent(target)
+                        request_headers = None
+                    if method == "GET" or not method_selector.needs_get(status_code):
+                        # A HEAD error is not final until GET confirms it
+                        redirect_cache.put_all(targets, status_code)
+                    return status_code, response_headers, body_bytes
+
+                def congested(status_code):
+                    # With a host controller, 429/503 mean "slow down": retried after the pause
+                    return host_controller is not None and status_code in CONGESTION_STATUSES
+
+                attempt = 0
+                status_code, error, response_headers, latency = await attempt_request(attempt)
+                if retry_policy.should_retry(attempt, status_code, error, congested(status_code)):
+                    # Backing-off URLs no longer count against the fresh URL window
+                    fresh_slots.release()
+                    while retry_policy.should_retry(attempt, status_code, error, congested(status_code)):
+                        metrics.record_retry()
+                        attempt += 1
+                        retry_after = retry_after_of(status_code, response_headers) if congested(status_code) else None
+                        await asyncio.sleep(retry_policy.delay_before(attempt, retry_after))
+                        previous = status_code, error, response_headers, latency
+                        status_code, error, response_headers, latency = await attempt_request(attempt)
+                        if isinstance(error, CircuitOpenError):
+                            # The circuit opened while this URL backed off; report what its request got
+                            status_code, error, response_headers, latency = previous
+                            break
+                else:
+                    fresh_slots.release()
+                metrics.record_result(status_code, error)
+
+                # Timeouts carry an empty message
+                reason = (str(error) or type(error).__name__) if error is not None else None
+                results_queue.put_nowait((item, status_code, reason, response_headers, latency))
+
+            async def feed():
+                """Starts a check per URL, pulling from the (possibly blocking) iterable off the loop."""
+                items = iter(urls_to_check)
+                try:
+                    while True:
+                        await fresh_slots.acquire()
+                        item = await loop.run_in_executor(None, next, items, None)
+                        if item is None:
+                            break
+                        task = asyncio.create_task(check_single(item))
+                        tasks.add(task)
+                        task.add_done_callback(tasks.discard)
+                    while tasks:
+                        await asyncio.gather(*tasks)
+                finally:
+                    # Also when the URL source fails: checks already started still report,
+                    # and the consumer always gets its end marker (the error is re-raised by await feeder)
+                    while tasks:
+                        await asyncio.gather(*tasks, return_exceptions=True)
+                    results_queue.put_nowait(None)
+
+            results_queue = asyncio.Queue()
+            fresh_slots = asyncio.Semaphore(max_in_flight * 2)
+            tasks = set()
+            feeder = asyncio.create_task(feed())
+            total = len(urls_to_check) if hasattr(urls_to_check, "__len__") else None
+
+            progress = tqdm(total=total, desc="Checking URLs")
+            while True:
+                result = await results_queue.get()
+                if result is None:
+                    break
+                (url, node_id, lastmod, cached), status_code, reason, response_headers, latency = result
+                progress.update(1)
+                if status_code == 304 and cached:
+                    # Not modified since the cached check
+                    status_code = cached.status
+
+                # Failures (code 0) also end up in the failure report with their reason
+                report_manager.append_check_result(
+                    url, status_code, node_id, reason, lastmod=lastmod, cached=cached, headers=response_headers,
+                    latency=latency
+                )
+
+                checked += 1
+            progress.close()
+            await feeder
+
+        total = connection_counts["new"] + connection_counts["reused"]
+        ratio = connection_counts["reused"] / total if total else 0.0
+        msg = (f"HTTP connections (async): {connection_counts['new']} new, "
+               f"{connection_counts['reused']} reused (reuse ratio {ratio:.1%})")
+        print(msg)
+        logging.info(msg)
+
+        return checked
@@ -0,0 +1,86 @@
+import logging
+from app.retry import RetryPolicy
+from app.host_limiter import HostConcurrencyController
+from app.circuit_breaker import HostCircuitBreaker
+from app.request_method import RequestMethodSelector
+from app.url_dedup import RedirectCache
+from app.url_checker import UrlChecker, CONNECTION_ERRORS, ERROR_KINDS, TLS_ERRORS
+
+
+class CheckRunner:
+    """Runs the configured check engine over (url, node_id, lastmod, cache_entry) items.
+
+    Per-host state (concurrency limits, circuit breaker, redirect cache, HEAD
+    support) lives here, so every URL of one engine run shares it, whichever
+    sitemap root it came from.
+    """
+    def __init__(self, config, session_pool, metrics):
+        self.config = config
+        self.session_pool = session_pool
+        self.metrics = metrics
+        self.host_controller = HostConcurrencyController.from_config(config)
+        self.redirect_cache = RedirectCache(config.redirect_cache_size, config.retry_statuses)
+        self.method_selector = RequestMethodSelector.from_config(config)
+
+    def run(self, urls_to_check, report_manager):
+        """Checks the items, handing each result to report_manager.append_check_result.
+
+        Both engines return the number of results they reported.
+        """
+        logging.info(f"Check engine: {self.config.engine}")
+        try:
+            return self._run_engine(urls_to_check, report_manager)
+        finally:
+            if self.host_controller is not None:
+                self.host_controller.log_summary()
+            if self.method_selector.head_first:
+                msg = f"HEAD checks: {self.method_selector.fallbacks} results repeated with GET"
+                print(msg)
+                logging.info(msg)
+
+    def _run_engine(self, urls_to_check, report_manager):
+        if self.config.engine == "async":
+            # Imported lazily so the threaded engine does not require aiohttp
+            from app.async_url_checker import (
+                AsyncUrlChecker, CONNECTION_ERRORS as ASYNC_CONNECTION_ERRORS, ERROR_KINDS as ASYNC_ERROR_KINDS,
+                TLS_ERRORS as ASYNC_TLS_ERRORS
+            )
+            return AsyncUrlChecker.check_urls(
+                urls_to_check,
+                report_manager=report_manager,
+                max_in_flight=self.config.max_in_flight,
+                keepalive_timeout=self.config.keepalive_timeout,
+                retry_policy=RetryPolicy.from_config(self.config, ASYNC_ERROR_KINDS),
+                host_controller=self.host_controller,
+                redirect_cache=self.redirect_cache,
+                metrics=self.metrics,
+                circuit_breaker=self._circuit_breaker(ASYNC_CONNECTION_ERRORS, ASYNC_TLS_ERRORS),
+                dns_cache_ttl=self.config.dns_cache_ttl,
+                method_selector=self.method_selector,
+                drain_bytes=self.config.drain_bytes
+            )
+
+        num_workers = self.config.num_workers
+        if self.config.adaptive_concurrency:
+            # Workers wait for host slots, so the pool must not cap what the controller allows
+            num_workers = max(num_workers, self.config.host_max_concurrency)
+        return UrlChecker.check_urls(
+            urls_to_check,
+            report_manager=report_manager,
+            session_pool=self.session_pool,
+            num_workers=num_workers,
+            retry_policy=RetryPolicy.from_config(self.config, ERROR_KINDS),
+            host_controller=self.host_controller,
+            redirect_cache=self.redirect_cache,
+            metrics=self.metrics,
+            circuit_breaker=self._circuit_breaker(CONNECTION_ERRORS, TLS_ERRORS),
+            method_selector=self.method_selector,
+            drain_bytes=self.config.drain_bytes
+        )
+
+    def _circuit_breaker(self, connection_errors, tls_errors):
+        circuit_breaker = HostCircuitBreaker.from_config(self.config, connection_errors, tls_errors)
+        if circuit_breaker is not None:
+            self.metrics.add_gauge("open_circuits", "Hosts whose URLs currently fail fast.",
+                                   circuit_breaker.open_count)
+        return circuit_breaker
@@ -0,0 +1,113 @@
+import time
+import logging
+import threading
+
+
+class CircuitOpenError(Exception):
+    """Check skipped because the host's circuit is open (the host is unreachable)."""
+
+
+class _Circuit:
+    __slots__ = ("failures", "open", "next_probe", "probing", "skipped")
+
+    def __init__(self):
+        self.failures = 0        # Consecutive connection failures
+        self.open = False
+        self.next_probe = 0.0    # Monotonic time of the next half-open probe
+        self.probing = False     # A probe request is in flight
+        self.skipped = 0
+
+
+class HostCircuitBreaker:
+    """Per-host circuit breaker for hosts that are down or do not resolve.
+
+    After `failure_threshold` consecutive connection failures (refused, DNS,
+    connect timeout) the host's circuit opens: its URLs fail at once with a
+    CircuitOpenError instead of going through every retry. Every
+    `probe_interval` seconds one request is let through as a half-open probe;
+    only an HTTP response closes the circuit again. TLS errors and other
+    failures of a reachable host (e.g. read timeouts) neither trip nor close it.
+    """
+    def __init__(self, failure_threshold=5, probe_interval=30.0, failure_types=(ConnectionError,), tls_types=()):
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.failure_types = tuple(failure_types)
+        self.tls_types = tuple(tls_types)
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, failure_types, tls_types=()):
+        """Returns a breaker, or None when it is disabled (threshold 0).
+
+        failure_types are the HTTP client's connection-level exceptions;
+        tls_types are the subclasses of those that mean a TLS problem.
+        """
+        if not config.circuit_failure_threshold:
+            return None
+        return cls(
+            failure_threshold=config.circuit_failure_threshold,
+            probe_interval=config.circuit_probe_interval,
+            failure_types=failure_types,
+            tls_types=tls_types
+        )
+
+    def allow(self, host):
+        """True if a request to host may be sent (closed circuit or a due half-open probe)."""
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or not circuit.open:
+                return True
+            if not circuit.probing and time.monotonic() >= circuit.next_probe:
+                circuit.probing = True
+                return True
+            circuit.skipped += 1
+            return False
+
+    def open_error(self, host):
+        return CircuitOpenError(
+            f"Circuit open: {host} unreachable after {self.failure_threshold} consecutive connection failures"
+        )
+
+    def record(self, host, error):
+        """Records the outcome of an allowed request; error is None when the host sent a response."""
+        # The host answered a TLS handshake, so it is reachable
+        failed = isinstance(error, self.failure_types) and not isinstance(error, self.tls_types)
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                if not failed:
+                    return
+                circuit = self._circuits[host] = _Circuit()
+            was_probe = circuit.probing
+            circuit.probing = False
+
+            if error is None:
+                if circuit.open:
+                    msg = f"Circuit closed: {host} is reachable again ({circuit.skipped} URLs failed fast)"
+                    print(msg)
+                    logging.info(msg)
+                del self._circuits[host]
+                return
+            if not failed:
+                # Neither a response nor a connection failure: the circuit stays as it is
+                if was_probe:
+                    circuit.next_probe = time.monotonic() + self.probe_interval
+                return
+
+            circuit.failures += 1
+            if circuit.open:
+                if was_probe:
+                    circuit.next_probe = time.monotonic() + self.probe_interval
+                return
+            if circuit.failures >= self.failure_threshold:
+                circuit.open = True
+                circuit.next_probe = time.monotonic() + self.probe_interval
+                msg = (f"Circuit open: {host} failed {circuit.failures} times in a row ({type(error).__name__}); "
+                       f"failing its URLs fast, probing every {self.probe_interval:g}s")
+                print(msg)
+                logging.warning(msg)
+
+    def open_count(self):
+        with self._lock:
+            return sum(1 for circuit in self._circuits.values() if circuit.open)
@@ -2,17 +2,159 @@ import os
 
 class Config:
     """Holds configuration paths and settings."""
-    def __init__(self, sitemap_url, resume=False, num_workers=10):
+    def __init__(self, sitemap_url, resume=False, num_workers=10, engine="threaded", max_in_flight=500,
+                 pool_connections=10, pool_maxsize=None, keep_alive=True, keepalive_timeout=30,
+                 retry_timeouts=(10, 15, 25, 40), retry_delays=(5, 10, 15), retry_statuses=(),
+                 retry_errors=("connection", "timeout"),
+                 crawl_workers=8, crawl_queue_size=10000,
+                 write_batch_size=500, write_flush_interval=1.0, write_fsync=False,
+                 incremental=False, cache_ttl=86400,
+                 adaptive_concurrency=False, host_initial_concurrency=4, host_max_concurrency=64,
+                 host_max_rps=None, redirect_cache_size=100000, shard_index=0, shard_count=1,
+                 metrics_port=None, metrics_host="127.0.0.1", metrics_file=None, metrics_interval=5.0,
+                 check_log=True, circuit_failure_threshold=5, circuit_probe_interval=30.0, dns_cache_ttl=300,
+                 head_first=False, get_only_hosts=(), drain_bytes=65536, revalidate_sitemaps=False,
+                 root_name=None, sample_size=None, sample_expand_rounds=0, sample_confidence=0.95,
+                 sample_seed=None):
         self.sitemap_url = sitemap_url
         self.resume = resume
         self.limit_requests = None
-        self.num_workers = num_workers  # Add this line
+        self.num_workers = num_workers
 
-        self.log_dir = "log"
-        self.reports_dir = "reports"
+        # Check engine: "threaded" (ThreadPoolExecutor) or "async" (asyncio + aiohttp)
+        self.engine = engine
+        # Maximum number of concurrent requests for the async engine
+        self.max_in_flight = max_in_flight
+
+        # HTTP connection pooling: number of per-host pools kept per session and
+        # connections per host pool (defaults to one per worker thread)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize or num_workers
+        self.keep_alive = keep_alive
+        # Seconds an idle keep-alive connection stays open (async engine)
+        self.keepalive_timeout = keepalive_timeout
+
+        # Retry policy: request timeout per attempt, backoff before each retry,
+        # HTTP status codes that are retried and the kinds of request errors that are
+        # (connection, timeout, tls, other; TLS errors and invalid URLs are final by default)
+        self.retry_timeouts = tuple(retry_timeouts)
+        self.retry_delays = tuple(retry_delays)
+        self.retry_statuses = tuple(retry_statuses)
+        self.retry_errors = tuple(retry_errors)
+
+        # Sitemap crawl: concurrent sitemap fetches and the size of the bounded
+        # queue that hands page URLs to the checker while the crawl is running
+        self.crawl_workers = crawl_workers
+        self.crawl_queue_size = crawl_queue_size
+
+        # Report writer durability: rows are flushed every write_batch_size rows or
+        # write_flush_interval seconds (and fsynced if write_fsync), so a crash
+        # loses at most one batch on resume
+        self.write_batch_size = write_batch_size
+        self.write_flush_interval = write_flush_interval
+        self.write_fsync = write_fsync
+
+        # Incremental mode: skip URLs whose sitemap lastmod is unchanged and that were
+        # healthy less than cache_ttl seconds ago; send conditional requests for the rest
+        self.incremental = incremental
+        self.cache_ttl = cache_ttl
+
+        # Per-host concurrency control: with adaptive_concurrency each host starts at
+        # host_initial_concurrency parallel requests and is tuned (AIMD) up to
+        # host_max_concurrency; host_max_rps optionally caps requests per second per host
+        self.adaptive_concurrency = adaptive_concurrency
+        self.host_initial_concurrency = host_initial_concurrency
+        self.host_max_concurrency = host_max_concurrency
+        self.host_max_rps = host_max_rps
+
+        # Per-host circuit breaker: after circuit_failure_threshold consecutive connection
+        # failures (0 disables it) a host's URLs fail fast; one probe request is sent every
+        # circuit_probe_interval seconds to detect recovery
+        self.circuit_failure_threshold = circuit_failure_threshold
+        self.circuit_probe_interval = circuit_probe_interval
+        # Seconds a resolved host name is reused for new connections (0 disables the cache)
+        self.dns_cache_ttl = dns_cache_ttl
+
+        # Body-free checks: with head_first URLs are checked with HEAD, falling back to GET on
+        # error statuses and for hosts that mishandle HEAD (remembered per host, or listed in
+        # get_only_hosts). GET bodies are streamed: up to drain_bytes are read so the
+        # connection can be reused, a longer body closes the connection instead.
+        self.head_first = head_first
+        self.get_only_hosts = tuple(get_only_hosts)
+        self.drain_bytes = drain_bytes
+
+        # Quick scan (--sample): check only sample_size random page URLs per sitemap and
+        # estimate dead-link rates at sample_confidence; sitemaps with dead links in the
+        # sample get up to sample_expand_rounds more samples. sample_seed repeats a sample.
+        self.sample_size = sample_size
+        self.sample_expand_rounds = sample_expand_rounds
+        self.sample_confidence = sample_confidence
+        self.sample_seed = sample_seed
+
+        # Redirect targets whose final status is remembered for the rest of the run
+        self.redirect_cache_size = redirect_cache_size
+
+        # Sharded runs (--shard i/N) check only the page URLs whose stable hash falls
+        # into shard i and keep their reports, logs, resume state and URL cache in
+        # their own subdirectories, so shards can run as separate processes or nodes
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        # Multi-root runs (several sitemaps in sitemap.txt) keep each root's reports,
+        # resume state and URL cache in its own root_name subdirectory; quick scans
+        # use a "sample" subdirectory so they never touch the state of a full run
+        self.root_name = root_name
+
+        self.log_dir = self._run_path("log")
+        self.reports_dir = self._run_path("reports")
 
         self.log_file = os.path.join(self.log_dir, "check_urls.log")
+        # Per-request check events as JSON lines, written off the check threads
+        self.check_log = check_log
+        self.check_log_file = os.path.join(self.log_dir, "checks.jsonl")
         self.url_checks_csv = os.path.join(self.reports_dir, "url_checks.csv")
         self.dead_sitemaps_csv = os.path.join(self.reports_dir, "dead_sitemaps.csv")
         self.sitemap_levels_csv = os.path.join(self.reports_dir, "sitemap_levels.csv")
-        self.failed_urls_csv = os.path.join(self.reports_dir, "failed_urls.csv")
\ No newline at end of file
+        self.failed_urls_csv = os.path.join(self.reports_dir, "failed_urls.csv")
+        # Result counts, failure kinds and latencies per sitemap, rolled up to its ancestors
+        self.sitemap_rollup_csv = os.path.join(self.reports_dir, "sitemap_rollup.csv")
+        # Quick scan reports (written to the sample subdirectory)
+        self.sample_checks_csv = os.path.join(self.reports_dir, "sample_checks.csv")
+        self.sample_estimates_csv = os.path.join(self.reports_dir, "sample_estimates.csv")
+        # Multi-root runs: one row per root with its result totals
+        self.roots_summary_csv = os.path.join(self.reports_dir, "roots_summary.csv")
+        # Indexed run state (SQLite); the check CSVs above are exported from it
+        self.state_db = os.path.join(self.reports_dir, "state.sqlite3")
+        # The crawl is recorded as it runs, so a resumed run replays it instead of
+        # fetching every sitemap again; with revalidate_sitemaps, recorded sitemaps
+        # whose HTTP validators changed are fetched again as well
+        self.crawl_snapshot_file = os.path.join(self.reports_dir, "crawl_snapshot.tsv")
+        self.revalidate_sitemaps = revalidate_sitemaps
+
+        # Per-URL results kept across runs (never cleared by a fresh run)
+        self.cache_dir = self._run_path("cache")
+        self.url_cache_db = os.path.join(self.cache_dir, "url_cache.sqlite3")
+
+        # Live metrics: a Prometheus text endpoint on metrics_host:metrics_port and/or a
+        # JSON snapshot rewritten every metrics_interval seconds. Shards of one launch
+        # get consecutive ports and their own JSON file.
+        self.metrics_port = metrics_port
+        self.metrics_host = metrics_host
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        if self.is_sharded:
+            if metrics_port is not None:
+                self.metrics_port = metrics_port + shard_index
+            if metrics_file is not None:
+                root, ext = os.path.splitext(metrics_file)
+                self.metrics_file = f"{root}.shard_{shard_index}_of_{shard_count}{ext}"
+
+    @property
+    def is_sharded(self):
+        return self.shard_count > 1
+
+    def _run_path(self, directory):
+        if self.root_name:
+            directory = os.path.join(directory, self.root_name)
+        if self.is_sharded:
+            directory = os.path.join(directory, f"shard_{self.shard_index}_of_{self.shard_count}")
+        return directory
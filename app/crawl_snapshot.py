@@ -0,0 +1,172 @@
+import os
+import re
+import threading
+
+# One tab-separated record per line, appended while the crawl runs:
+#   S  node_id  parent_id  url            sitemap node, written before any record that refers to it
+#   V  node_id  etag  last_modified       HTTP validators of a fetched sitemap
+#   P  node_id  lastmod  url              page URL listed by the sitemap
+#   D  node_id  url                       the sitemap could not be fetched
+#   F  node_id                            every page and child sitemap of the node is recorded
+#   E  max_depth                          the whole tree is recorded (the depth also follows from the S records)
+_ESCAPES = {"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"}
+_UNESCAPES = {"t": "\t", "n": "\n", "r": "\r"}
+_ESCAPED = re.compile(r"\\(.)")
+
+
+def _escape(value):
+    if not value:
+        return ""
+    for char in ("\\", "\t", "\n", "\r"):
+        if char in value:
+            value = value.replace(char, _ESCAPES[char])
+    return value
+
+
+def _unescape(value):
+    if not value:
+        return None
+    if "\\" not in value:
+        return value
+    return _ESCAPED.sub(lambda match: _UNESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def _lines(f, end=None):
+    """Yields every complete line of a binary file object, up to byte offset end."""
+    position = 0
+    for line in f:
+        position += len(line)
+        if end is not None and position > end:
+            break
+        if not line.endswith(b"\n"):
+            # Cut off by a crash while writing; the record never happened
+            break
+        yield line
+
+
+def _records(f, end=None, skip_pages=False):
+    """Yields (kind, fields) for the records of a binary file object."""
+    for line in _lines(f, end):
+        if skip_pages and line.startswith(b"P\t"):
+            continue
+        fields = line[:-1].decode("utf-8").split("\t")
+        yield fields[0], fields
+
+
+class CrawlSnapshotWriter:
+    """Appends crawl records to the snapshot file; safe to call from the crawl threads."""
+    def __init__(self, path, append=False):
+        self.path = path
+        self._file = open(path, "a" if append else "w", encoding="utf-8", newline="\n")
+        self._lock = threading.Lock()
+
+    def _write(self, *fields, flush=False):
+        line = "\t".join(fields) + "\n"
+        with self._lock:
+            if self._file.closed:
+                # Late records of a crawl that was stopped
+                return
+            self._file.write(line)
+            if flush:
+                self._file.flush()
+
+    def sitemap(self, node_id, parent_id, url):
+        self._write("S", str(node_id), str(parent_id), _escape(url))
+
+    def validators(self, node_id, etag, last_modified):
+        self._write("V", str(node_id), _escape(etag), _escape(last_modified))
+
+    def page(self, node_id, url, lastmod):
+        self._write("P", str(node_id), _escape(lastmod), _escape(url))
+
+    def dead(self, node_id, url):
+        self._write("D", str(node_id), _escape(url))
+
+    def finished(self, node_id):
+        # Flushed so a crash loses at most the sitemaps still in progress
+        self._write("F", str(node_id), flush=True)
+
+    def complete(self, max_depth):
+        self._write("E", str(max_depth), flush=True)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class CrawlSnapshot:
+    """A recorded crawl: the sitemap tree, validators and finished/dead sitemaps.
+
+    Page records are not held in memory; iter_pages() streams them from the
+    file. An interrupted crawl leaves a valid snapshot whose unfinished
+    sitemaps have to be fetched again.
+    """
+    def __init__(self, path, tree):
+        self.path = path
+        self.tree = tree
+        self.validators = {}   # node id -> (etag, last_modified)
+        self.dead = {}         # node id -> sitemap url
+        self.finished = set()  # node ids whose pages and child sitemaps are all recorded
+        self.complete = False
+
+    @classmethod
+    def load(cls, path, tree):
+        """Reads every record except the page URLs into tree (which must be empty)."""
+        snapshot = cls(path, tree)
+        with open(path, "rb") as f:
+            for kind, fields in _records(f, skip_pages=True):
+                if kind == "S":
+                    node_id = tree.add(_unescape(fields[3]), int(fields[2]))
+                    if node_id != int(fields[1]):
+                        raise ValueError(f"{path}: sitemap records out of order at node {fields[1]}")
+                elif kind == "V":
+                    snapshot.validators[int(fields[1])] = (_unescape(fields[2]), _unescape(fields[3]))
+                elif kind == "D":
+                    snapshot.dead[int(fields[1])] = _unescape(fields[2])
+                elif kind == "F":
+                    snapshot.finished.add(int(fields[1]))
+                elif kind == "E":
+                    snapshot.complete = True
+        return snapshot
+
+    @staticmethod
+    def root_url_of(path):
+        """Returns the root sitemap url recorded in the snapshot file (None if there is none)."""
+        with open(path, "rb") as f:
+            for kind, fields in _records(f):
+                return _unescape(fields[3]) if kind == "S" else None
+        return None
+
+    def unfinished(self):
+        return {node_id for node_id in range(len(self.tree)) if node_id not in self.finished}
+
+    def iter_pages(self, node_ids, end=None):
+        """Yields (url, node_id, lastmod) for the recorded pages of the given sitemaps."""
+        with open(self.path, "rb") as f:
+            for kind, fields in _records(f, end):
+                if kind == "P":
+                    node_id = int(fields[1])
+                    if node_id in node_ids:
+                        yield _unescape(fields[3]), node_id, _unescape(fields[2])
+
+    def drop(self, node_ids):
+        """Rewrites the file without the records of node_ids (which will be fetched again).
+
+        Sitemap nodes stay so node ids remain stable. Returns the new file size;
+        records appended later start there.
+        """
+        temp_path = f"{self.path}.tmp"
+        with open(self.path, "rb") as source, open(temp_path, "wb") as target:
+            for line in _lines(source):
+                kind, node_id = line.split(b"\t", 2)[:2]
+                if kind == b"E" or (kind != b"S" and int(node_id) in node_ids):
+                    continue
+                target.write(line)
+            size = target.tell()
+        os.replace(temp_path, self.path)
+        self.finished -= node_ids
+        for node_id in node_ids:
+            self.validators.pop(node_id, None)
+            self.dead.pop(node_id, None)
+        self.complete = False
+        return size
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Responses that mean "slow down" rather than "this URL is broken"
+CONGESTION_STATUSES = frozenset({429, 503})
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+def parse_retry_after(value):
+    """Returns the Retry-After header value in seconds (delta or HTTP date), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_of(status_code, headers):
+    """Seconds a congestion response (429/503) asks the client to wait, or None."""
+    if headers is None or status_code not in CONGESTION_STATUSES:
+        return None
+    return parse_retry_after(headers.get("Retry-After"))
+
+
+class _HostState:
+    __slots__ = ("limit", "in_flight", "next_request_at", "paused_until",
+                 "min_latency", "avg_latency", "last_decrease", "requests")
+
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.next_request_at = 0.0
+        self.paused_until = 0.0
+        self.min_latency = None
+        self.avg_latency = None
+        self.last_decrease = 0.0
+        self.requests = 0
+
+
+class HostConcurrencyController:
+    """Per-host concurrency limits adjusted by AIMD, with optional requests-per-second caps.
+
+    Each host's limit grows additively (about +1 per round trip) while responses
+    are healthy, and is cut multiplicatively on 429/503, request errors
+    (timeouts, resets) or when average latency climbs well above the best seen. A
+    Retry-After header pauses the host for that long.
+    """
+    def __init__(self, adaptive=True, initial_limit=4, min_limit=1, max_limit=64, increase=1.0,
+                 decrease=0.5, latency_tolerance=3.0, latency_slack=0.05, max_rps=None):
+        self.adaptive = adaptive
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        # Absolute margin (seconds) so jitter on very fast origins is not read as congestion
+        self.latency_slack = latency_slack
+        self.interval = 1.0 / max_rps if max_rps else 0.0
+        self._hosts = {}
+        self._cond = threading.Condition()
+        self._async_conditions = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Returns a controller, or None when neither adaptive mode nor an RPS cap is configured."""
+        if not (config.adaptive_concurrency or config.host_max_rps):
+            return None
+        return cls(
+            adaptive=config.adaptive_concurrency,
+            initial_limit=config.host_initial_concurrency,
+            max_limit=config.host_max_concurrency,
+            max_rps=config.host_max_rps
+        )
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.initial_limit)
+        return state
+
+    def try_acquire(self, host):
+        """Takes a request slot for host; returns 0, seconds to wait, or None (wait for a release)."""
+        with self._cond:
+            return self._try_acquire_locked(host)
+
+    def _try_acquire_locked(self, host):
+        state = self._state(host)
+        now = time.monotonic()
+        if now < state.paused_until:
+            return state.paused_until - now
+        if self.adaptive and state.in_flight >= int(state.limit):
+            return None
+        if self.interval:
+            if now < state.next_request_at:
+                return state.next_request_at - now
+            state.next_request_at = max(now, state.next_request_at) + self.interval
+        state.in_flight += 1
+        state.requests += 1
+        return 0
+
+    def cancel(self, host):
+        """Returns a slot whose request was never sent, without adapting the limit."""
+        with self._cond:
+            self._state(host).in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, host, status_code, error, latency, retry_after=None):
+        """Returns a slot and adapts the host's limit to the outcome of the request."""
+        with self._cond:
+            state = self._state(host)
+            state.in_flight -= 1
+            now = time.monotonic()
+
+            congested = error is not None or status_code in CONGESTION_STATUSES
+            if retry_after:
+                state.paused_until = max(state.paused_until, now + retry_after)
+                congested = True
+            if error is None and latency is not None:
+                state.min_latency = latency if state.min_latency is None else min(state.min_latency, latency)
+                state.avg_latency = latency if state.avg_latency is None else 0.8 * state.avg_latency + 0.2 * latency
+                if state.avg_latency > state.min_latency * self.latency_tolerance + self.latency_slack:
+                    congested = True
+
+            if self.adaptive:
+                if congested:
+                    # Cut at most once per round trip, like TCP, so one burst of errors is one signal
+                    if now - state.last_decrease >= (state.avg_latency or 0):
+                        state.limit = max(self.min_limit, state.limit * self.decrease)
+                        state.last_decrease = now
+                else:
+                    state.limit = min(self.max_limit, state.limit + self.increase / state.limit)
+            self._cond.notify_all()
+
+    async def acquire_async(self, host):
+        """Waits on the event loop until host has a free slot."""
+        cond = self._async_conditions.get(host)
+        if cond is None:
+            cond = self._async_conditions[host] = asyncio.Condition()
+        async with cond:
+            while True:
+                wait = self.try_acquire(host)
+                if wait == 0:
+                    return
+                try:
+                    await asyncio.wait_for(cond.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release_async(self, host, status_code, error, latency, retry_after=None):
+        """Event-loop variant of release()."""
+        self.release(host, status_code, error, latency, retry_after)
+        cond = self._async_conditions.get(host)
+        if cond is not None:
+            async with cond:
+                cond.notify_all()
+
+    def log_summary(self):
+        with self._cond:
+            for host, state in sorted(self._hosts.items()):
+                latency = f"{state.avg_latency * 1000:.0f}ms" if state.avg_latency is not None else "n/a"
+                logging.info(f"Host {host}: {state.requests} requests, concurrency limit "
+                             f"{state.limit:.1f}, average latency {latency}")
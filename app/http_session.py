@@ -0,0 +1,225 @@
+import time
+import socket
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import connection, connectionpool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError, NameResolutionError
+
+
+class _ConnectionStats:
+    """Thread-safe counters for requests sent and connections opened."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def add_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def add_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def reuse_ratio(self):
+        """Share of requests served over an already open connection."""
+        with self._lock:
+            if not self.requests:
+                return 0.0
+            return max(0.0, 1 - self.new_connections / self.requests)
+
+
+class DnsCache:
+    """Caches getaddrinfo() results per (host, port) for ttl seconds.
+
+    Failed lookups are cached for negative_ttl seconds, so a host that does
+    not resolve is not looked up again for each of its URLs.
+    """
+    def __init__(self, ttl=300.0, negative_ttl=30.0, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = {}  # (host, port) -> (expires, addresses or gaierror)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host, port):
+        """Returns the (family, sockaddr) addresses for host:port; raises socket.gaierror."""
+        key = (host, port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                result = entry[1]
+            else:
+                self.misses += 1
+                result = None
+        if result is None:
+            try:
+                infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+                result = [(family, sockaddr) for family, _, _, _, sockaddr in infos]
+                expires = now + self.ttl
+            except socket.gaierror as e:
+                result = e
+                expires = now + self.negative_ttl
+            with self._lock:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[key] = (expires, result)
+        if isinstance(result, socket.gaierror):
+            raise result
+        return result
+
+
+def _counting_connection(base, stats, dns_cache=None):
+    """Builds a urllib3 connection class that records every TCP connection it opens.
+
+    Counted in connect(), which also runs when urllib3 reopens a dropped
+    keep-alive connection in place. With a dns_cache the host is resolved
+    through it.
+    """
+    class Connection(base):
+        def connect(self):
+            super().connect()
+            stats.add_connection()
+
+        def _new_conn(self):
+            if dns_cache is None:
+                return super()._new_conn()
+            host = self._dns_host
+            try:
+                addresses = dns_cache.resolve(host, self.port)
+            except socket.gaierror as e:
+                raise NameResolutionError(self.host, self, e) from e
+            error = None
+            for _, sockaddr in addresses:
+                # Only the TCP connect uses the address; TLS (SNI, certificate) still sees the host name
+                self._dns_host = sockaddr[0]
+                try:
+                    return super()._new_conn()
+                except (ConnectTimeoutError, NewConnectionError) as e:
+                    error = e
+                finally:
+                    self._dns_host = host
+            raise error
+
+    Connection.__name__ = base.__name__
+    return Connection
+
+
+def _counting_pool_classes(stats, dns_cache=None):
+    """Builds urllib3 pool classes whose connections record every new TCP connection."""
+    # Class names match urllib3's so error messages (failure reasons) stay unchanged
+    class HTTPConnectionPool(connectionpool.HTTPConnectionPool):
+        ConnectionCls = _counting_connection(connection.HTTPConnection, stats, dns_cache)
+
+    class HTTPSConnectionPool(connectionpool.HTTPSConnectionPool):
+        ConnectionCls = _counting_connection(connection.HTTPSConnection, stats, dns_cache)
+
+    return {"http": HTTPConnectionPool, "https": HTTPSConnectionPool}
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report to a shared _ConnectionStats."""
+    def __init__(self, stats, dns_cache=None, **kwargs):
+        self._stats = stats
+        self._dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _counting_pool_classes(self._stats, self._dns_cache)
+
+    def send(self, request, **kwargs):
+        self._stats.add_request()
+        return super().send(request, **kwargs)
+
+
+def drain_response(resp, limit):
+    """Reads at most limit body bytes of a streamed response and returns the bytes pulled over the wire.
+
+    A body that fits is read to the end, so the connection goes back to the
+    pool; a longer one is abandoned and its connection closed.
+    """
+    length = resp.headers.get("Content-Length")
+    if resp.request.method != "HEAD" and not (length and length.isdigit() and int(length) > limit):
+        read = 0
+        for chunk in resp.iter_content(8192):
+            read += len(chunk)
+            if read > limit:
+                break
+    resp.close()
+    return resp.raw.tell()
+
+
+class SessionPool:
+    """Hands out one keep-alive requests.Session per thread, sharing connection stats."""
+    def __init__(self, pool_connections=10, pool_maxsize=10, keep_alive=True, dns_cache=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.keep_alive = keep_alive
+        self.dns_cache = dns_cache  # Shared by every session; None resolves on each new connection
+        self.stats = _ConnectionStats()
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            pool_connections=config.pool_connections,
+            pool_maxsize=config.pool_maxsize,
+            keep_alive=config.keep_alive,
+            dns_cache=DnsCache(ttl=config.dns_cache_ttl) if config.dns_cache_ttl else None
+        )
+
+    def get_session(self):
+        """Returns the calling thread's session, creating it on first use."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._create_session()
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def get(self, url, **kwargs):
+        return self.get_session().get(url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        return self.get_session().request(method, url, **kwargs)
+
+    def _create_session(self):
+        session = requests.Session()
+        # Retries are handled by UrlChecker, so the adapter never retries on its own
+        adapter = _CountingAdapter(
+            self.stats,
+            dns_cache=self.dns_cache,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=0
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def log_stats(self, label="HTTP"):
+        msg = (f"{label} connections: {self.stats.requests} requests over "
+               f"{self.stats.new_connections} new connections "
+               f"(reuse ratio {self.stats.reuse_ratio():.1%})")
+        print(msg)
+        logging.info(msg)
+        if self.dns_cache is not None:
+            logging.info(f"DNS cache: {self.dns_cache.hits} hits, {self.dns_cache.misses} lookups")
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
@@ -1,11 +1,45 @@
 import os
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
+
+CHECK_LOGGER = "checks"  # Per-request check events, written as JSON lines
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats a check event (the record's `check` dict) as one JSON line."""
+    def format(self, record):
+        event = {"time": round(record.created, 3)}
+        event.update(getattr(record, "check", {}))
+        return json.dumps(event, separators=(",", ":"))
+
+
+def log_check(url, node_id, attempt, status_code, error, latency, body_bytes=None):
+    """Records one check attempt in the JSONL check log (if enabled); never blocks on disk I/O."""
+    logger = logging.getLogger(CHECK_LOGGER)
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    event = {
+        "url": url, "node": node_id, "attempt": attempt, "status": status_code,
+        "latency_ms": round(latency * 1000, 1)
+    }
+    if body_bytes is not None:
+        event["bytes"] = body_bytes
+    if error is not None:
+        event["error"] = type(error).__name__
+        event["reason"] = str(error)
+    logger.debug("check", extra={"check": event})
+
 
 class LoggerSetup:
     """Handles logging configuration."""
+    _listener = None
+
     @staticmethod
     def setup(config):
         os.makedirs(config.log_dir, exist_ok=True)
+        LoggerSetup.shutdown()
 
         logger = logging.getLogger()
         logger.setLevel(logging.DEBUG)
@@ -16,11 +50,33 @@ class LoggerSetup:
 
         formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
 
-        # File Handler: DEBUG level (includes individual checks)
+        # File Handler: DEBUG level, formatted and written by a listener thread
         file_handler = logging.FileHandler(config.log_file, mode='a')
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        file_handlers = [file_handler]
+
+        # Check events go to their own JSONL file instead of the main log
+        check_logger = logging.getLogger(CHECK_LOGGER)
+        check_logger.handlers.clear()
+        check_logger.propagate = False
+        if config.check_log:
+            check_handler = logging.FileHandler(config.check_log_file, mode='a')
+            check_handler.setFormatter(JsonLinesFormatter())
+            check_handler.addFilter(lambda record: record.name == CHECK_LOGGER)
+            file_handler.addFilter(lambda record: record.name != CHECK_LOGGER)
+            file_handlers.append(check_handler)
+            check_logger.setLevel(logging.DEBUG)
+        else:
+            check_logger.setLevel(logging.CRITICAL + 1)
+
+        # Callers only enqueue records; disk I/O happens on the listener thread
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        logger.addHandler(queue_handler)
+        check_logger.addHandler(queue_handler)
+        LoggerSetup._listener = logging.handlers.QueueListener(log_queue, *file_handlers, respect_handler_level=True)
+        LoggerSetup._listener.start()
 
         # Console Handler: INFO level (summary/errors only)
         console_handler = logging.StreamHandler()
@@ -29,4 +85,17 @@ class LoggerSetup:
         logger.addHandler(console_handler)
 
         # Silence noisy libraries
-        logging.getLogger("urllib3").setLevel(logging.WARNING)
\ No newline at end of file
+        logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+    @staticmethod
+    def shutdown():
+        """Writes every queued log record and stops the listener thread."""
+        if LoggerSetup._listener is not None:
+            LoggerSetup._listener.stop()
+            for handler in LoggerSetup._listener.handlers:
+                handler.close()
+            LoggerSetup._listener = None
+
+
+# Queued records would be lost if the interpreter exited first
+atexit.register(LoggerSetup.shutdown)
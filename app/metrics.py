@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MAX_HOSTS = 1000  # Hosts beyond this share one "other" histogram
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None if empty or beyond the last bucket)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+        return None
+
+
+class Metrics:
+    """Thread-safe counters, gauges and per-host latency histograms for one run.
+
+    Updates are a few integer operations under one lock, so the check engines
+    record every request without slowing down.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.results_by_status = Counter()
+        self.failures_by_reason = Counter()
+        self.retries = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.body_bytes = 0  # Response body bytes downloaded by checks
+        self.crawl = Counter()  # sitemaps_discovered, sitemaps_done, sitemaps_failed, page_urls_found
+        self._latency_by_host = {}
+        self._gauges = {}  # name -> (help text, callable returning the current value)
+
+    def add_gauge(self, name, help_text, read):
+        """Registers a gauge that is read when metrics are exported."""
+        self._gauges[name] = (help_text, read)
+
+    def request_started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def request_finished(self, host, latency, body_bytes=0):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests += 1
+            self.body_bytes += body_bytes
+            histogram = self._latency_by_host.get(host)
+            if histogram is None:
+                if len(self._latency_by_host) >= MAX_HOSTS:
+                    host = "other"
+                histogram = self._latency_by_host.setdefault(host, _Histogram())
+            histogram.observe(latency)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_result(self, status_code, error=None):
+        """Counts a final check result; failures are counted by exception type."""
+        with self._lock:
+            self.results_by_status[status_code] += 1
+            if error is not None:
+                self.failures_by_reason[type(error).__name__] += 1
+
+    def crawl_event(self, name, amount=1):
+        with self._lock:
+            self.crawl[name] += amount
+
+    def snapshot(self):
+        """Returns every metric as a JSON-serializable dict."""
+        with self._lock:
+            latency = {
+                host: {
+                    "count": h.count,
+                    "sum": round(h.total, 6),
+                    "p50": h.quantile(0.5),
+                    "p99": h.quantile(0.99),
+                    "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], h.buckets)),
+                }
+                for host, h in self._latency_by_host.items()
+            }
+            snapshot = {
+                "timestamp": time.time(),
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "checked": sum(self.results_by_status.values()),
+                "results_by_status": {str(k): v for k, v in sorted(self.results_by_status.items())},
+                "failures_by_reason": dict(self.failures_by_reason),
+                "retries": self.retries,
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "body_bytes": self.body_bytes,
+                "crawl": dict(self.crawl),
+                "latency_seconds_by_host": latency,
+            }
+        snapshot["gauges"] = {name: read() for name, (_, read) in self._gauges.items()}
+        return snapshot
+
+    def prometheus_text(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        with self._lock:
+            metric("url_checks_total", "counter", "Final check results by HTTP status (0 = failure).",
+                   [((("status", str(s)),), n) for s, n in sorted(self.results_by_status.items())])
+            metric("url_check_failures_total", "counter", "Failed checks by error type.",
+                   [((("reason", r),), n) for r, n in sorted(self.failures_by_reason.items())])
+            metric("url_check_retries_total", "counter", "Retried check attempts.", [((), self.retries)])
+            metric("url_checks_in_flight", "gauge", "Requests currently in flight.", [((), self.in_flight)])
+            metric("url_check_body_bytes_total", "counter", "Response body bytes downloaded by checks.",
+                   [((), self.body_bytes)])
+            metric("sitemap_crawl_total", "counter", "Sitemap crawl progress.",
+                   [((("event", e),), n) for e, n in sorted(self.crawl.items())])
+
+            lines.append("# HELP url_check_latency_seconds Request latency per host.")
+            lines.append("# TYPE url_check_latency_seconds histogram")
+            for host, h in sorted(self._latency_by_host.items()):
+                host = _escape(host)
+                cumulative = 0
+                for bound, count in zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], h.buckets):
+                    cumulative += count
+                    lines.append(f'url_check_latency_seconds_bucket{{host="{host}",le="{bound}"}} {cumulative}')
+                lines.append(f'url_check_latency_seconds_sum{{host="{host}"}} {h.total}')
+                lines.append(f'url_check_latency_seconds_count{{host="{host}"}} {h.count}')
+
+        for name, (help_text, read) in self._gauges.items():
+            metric(name, "gauge", help_text, [((), read())])
+        return "\n".join(lines) + "\n"
+
+    def log_summary(self):
+        """Prints and logs the final totals and the slowest hosts."""
+        snapshot = self.snapshot()
+        per_request = snapshot["body_bytes"] / snapshot["requests"] if snapshot["requests"] else 0
+        lines = [
+            f"Metrics: {snapshot['checked']} checks in {snapshot['elapsed_seconds']:.1f}s, "
+            f"{snapshot['retries']} retries, crawl {snapshot['crawl']}",
+            f"Downloaded {snapshot['body_bytes']:,} body bytes in {snapshot['requests']} requests "
+            f"({per_request:,.0f} bytes per request)"
+        ]
+        if snapshot["failures_by_reason"]:
+            lines.append(f"Failures by reason: {snapshot['failures_by_reason']}")
+        slowest = sorted(snapshot["latency_seconds_by_host"].items(), key=lambda item: -(item[1]["p99"] or 0))
+        for host, latency in slowest[:5]:
+            lines.append(f"  {host}: {latency['count']} requests, p50 <= {latency['p50']}s, p99 <= {latency['p99']}s")
+        for line in lines:
+            print(line)
+            logging.info(line)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsExporter:
+    """Exposes Metrics live: a Prometheus text endpoint and/or a periodically rewritten JSON file."""
+    def __init__(self, metrics, port=None, host="127.0.0.1", json_path=None, interval=5.0):
+        self.metrics = metrics
+        self.port = port
+        self.host = host
+        self.json_path = json_path
+        self.interval = interval
+        self._server = None
+        self._stop = threading.Event()
+        self._threads = []
+
+    @classmethod
+    def from_config(cls, metrics, config):
+        return cls(
+            metrics,
+            port=config.metrics_port,
+            host=config.metrics_host,
+            json_path=config.metrics_file,
+            interval=config.metrics_interval
+        )
+
+    def start(self):
+        if self.port is not None:
+            self._server = ThreadingHTTPServer((self.host, self.port), _metrics_handler(self.metrics))
+            self._server.daemon_threads = True
+            self._start_thread(self._server.serve_forever, "metrics-http")
+            msg = f"Metrics at http://{self.host}:{self.port}/metrics"
+            print(msg)
+            logging.info(msg)
+        if self.json_path is not None:
+            self._start_thread(self._write_periodically, "metrics-json")
+        return self
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _write_periodically(self):
+        while not self._stop.wait(self.interval):
+            self.write_json()
+
+    def write_json(self):
+        """Replaces the JSON file atomically, so readers never see a partial file."""
+        directory = os.path.dirname(self.json_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.json_path}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.metrics.snapshot(), f, indent=2)
+            os.replace(temp_path, self.json_path)
+        except OSError as e:
+            logging.error(f"Could not write metrics to {self.json_path}: {e}")
+
+    def stop(self):
+        """Stops exporting; the JSON file gets a final snapshot."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join()
+        if self.json_path is not None:
+            self.write_json()
+
+
+def _metrics_handler(metrics):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,267 @@
+import os
+import re
+import csv
+import hashlib
+import logging
+import threading
+from collections import Counter, deque
+from app.app import SitemapCheckerApp
+from app.check_runner import CheckRunner
+from app.config import Config
+from app.http_session import SessionPool
+from app.logger_setup import LoggerSetup
+from app.metrics import Metrics, MetricsExporter
+from app.report_manager import ReportManager
+from app.state_store import StateStore
+
+
+def root_dir_name(sitemap_url):
+    """Stable, readable directory name for a sitemap root (host and path plus a short hash)."""
+    readable = re.sub(r"[^A-Za-z0-9]+", "_", sitemap_url.split("://", 1)[-1]).strip("_")[:60]
+    digest = hashlib.blake2b(sitemap_url.encode("utf-8"), digest_size=4).hexdigest()
+    return f"{readable}_{digest}"
+
+
+def read_sitemap_urls(path):
+    """Returns the sitemap URLs in path, one per non-empty line (lines starting with # are skipped)."""
+    urls = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and line not in urls:
+                urls.append(line)
+    return urls
+
+
+class FairInterleaver:
+    """Merges several item streams round-robin so no stream waits behind another.
+
+    Every stream is read by its own thread into a small buffer (a slow sitemap
+    crawl only stalls its own root); the consumer takes one item from each
+    stream that has items ready in turn. An error in one stream ends that
+    stream only.
+    """
+    def __init__(self, streams, names, buffer_size=100):
+        self._streams = streams
+        self._names = names
+        self._buffer_size = buffer_size
+        self._buffers = [deque() for _ in streams]
+        self._done = [False] * len(streams)
+        self._stopped = False
+        self._condition = threading.Condition()
+        self.errors = {}  # stream index -> exception that ended it
+
+    def __iter__(self):
+        threads = [
+            threading.Thread(target=self._read, args=(index,), name=f"root-{index}", daemon=True)
+            for index in range(len(self._streams))
+        ]
+        for thread in threads:
+            thread.start()
+        position = 0
+        count = len(self._streams)
+        try:
+            while True:
+                with self._condition:
+                    while True:
+                        index = next(
+                            (i % count for i in range(position, position + count) if self._buffers[i % count]),
+                            None
+                        )
+                        if index is not None:
+                            break
+                        if all(self._done):
+                            return
+                        self._condition.wait()
+                    item = self._buffers[index].popleft()
+                    if len(self._buffers[index]) == self._buffer_size - 1:
+                        # The reader may be waiting for room
+                        self._condition.notify_all()
+                position = index + 1
+                yield item
+        finally:
+            with self._condition:
+                self._stopped = True
+                self._condition.notify_all()
+            for thread in threads:
+                thread.join()
+
+    def _read(self, index):
+        stream = iter(self._streams[index])
+        buffer = self._buffers[index]
+        try:
+            for item in stream:
+                with self._condition:
+                    while len(buffer) >= self._buffer_size and not self._stopped:
+                        self._condition.wait()
+                    if self._stopped:
+                        break
+                    buffer.append(item)
+                    if len(buffer) == 1:
+                        self._condition.notify_all()
+        except Exception as e:
+            self.errors[index] = e
+            msg = f"Root {self._names[index]} stopped: {e}"
+            print(msg)
+            logging.exception(msg)
+        finally:
+            # Closed on this thread, which is the one running the generator
+            if hasattr(stream, "close"):
+                stream.close()
+            with self._condition:
+                self._done[index] = True
+                self._condition.notify_all()
+
+
+class _RootReports:
+    """Routes engine results to the ReportManager of the root they came from.
+
+    Items carry (root index, sitemap node id) as their node id; the engines
+    pass it through untouched.
+    """
+    def __init__(self, report_managers):
+        self.report_managers = report_managers
+
+    def append_check_result(self, url, status_code, node_id, reason=None, lastmod=None, cached=None, headers=None,
+                            latency=None):
+        root_index, node_id = node_id
+        self.report_managers[root_index].append_check_result(
+            url, status_code, node_id, reason, lastmod=lastmod, cached=cached, headers=headers, latency=latency
+        )
+
+
+class MultiRootApp:
+    """Checks every sitemap root of sitemap.txt concurrently through one check engine.
+
+    Each root is a SitemapCheckerApp with its own reports, resume state and
+    crawl snapshot in reports/<root>/, so every root resumes independently.
+    Their pending URLs are interleaved fairly into a single engine run, which
+    shares connections, per-host limits and circuit breakers across roots.
+    A combined summary is written to reports/roots_summary.csv.
+    """
+    def __init__(self, sitemap_urls, resume=False, **config_options):
+        self.config = Config(None, resume, **config_options)
+        # Files in reports/ and log/ are replaced; root subdirectories are kept
+        ReportManager(self.config).prepare_environment()
+        LoggerSetup.setup(self.config)
+
+        self.session_pool = SessionPool.from_config(self.config)
+        self.metrics = Metrics()
+        self.roots = [
+            SitemapCheckerApp(
+                sitemap_url, resume, session_pool=self.session_pool, metrics=self.metrics, setup_logging=False,
+                root_name=root_dir_name(sitemap_url), **config_options
+            )
+            for sitemap_url in sitemap_urls
+        ]
+        self.metrics.add_gauge(
+            "report_writer_queue_depth", "Results waiting for the report writer.",
+            lambda: sum(root.report_manager.queue_depth() for root in self.roots)
+        )
+
+    def run(self):
+        msg = f"Checking {len(self.roots)} sitemap roots through one shared scheduler..."
+        print(msg)
+        logging.info(msg)
+
+        names = [root.config.sitemap_url for root in self.roots]
+        interleaver = FairInterleaver(
+            [self._tagged(index, root.pending_checks()) for index, root in enumerate(self.roots)], names
+        )
+        for root in self.roots:
+            root.report_manager.start_writer()
+        exporter = MetricsExporter.from_config(self.metrics, self.config).start()
+        runner = CheckRunner(self.config, self.session_pool, self.metrics)
+        try:
+            checked = runner.run(interleaver, _RootReports([root.report_manager for root in self.roots]))
+        finally:
+            # Persist every result checked so far, also when the run is interrupted
+            for root in self.roots:
+                root.report_manager.close()
+            exporter.stop()
+            SitemapCheckerApp.log_deduplication(
+                sum(root.report_manager.deduplicator.duplicates for root in self.roots),
+                runner.redirect_cache.hits
+            )
+        self.metrics.log_summary()
+        unchanged_skipped = sum(root.unchanged_skipped for root in self.roots)
+        if self.config.incremental:
+            msg = f"Incremental run: {unchanged_skipped} unchanged URLs taken from the cache"
+            print(msg)
+            logging.info(msg)
+        if not checked and not unchanged_skipped:
+            msg = "All URLs have already been checked."
+            print(msg)
+            logging.info(msg)
+
+        self.session_pool.log_stats()
+        self.session_pool.close()
+        summaries = []
+        for index, root in enumerate(self.roots):
+            summaries.append(self._root_summary(root, interleaver.errors.get(index)))
+            root.export_reports()
+        self._summarize(summaries)
+        return not interleaver.errors
+
+    @staticmethod
+    def _tagged(root_index, items):
+        """Tags each item's node id with its root, for _RootReports."""
+        for url, node_id, lastmod, cached in items:
+            yield url, (root_index, node_id), lastmod, cached
+
+    @staticmethod
+    def _root_summary(root, error):
+        counts = Counter(root.report_manager.status_counts())
+        return {
+            "root_url": root.config.sitemap_url,
+            "reports_dir": root.config.reports_dir,
+            "urls": sum(counts.values()),
+            "ok": sum(count for status, count in counts.items() if 0 < status < 400),
+            "client_errors": sum(count for status, count in counts.items() if 400 <= status < 500),
+            "server_errors": sum(count for status, count in counts.items() if status >= 500),
+            "inaccessible": counts.get(0, 0),
+            "dead_sitemaps": len(root.crawler.inaccessible_sitemaps),
+            "error": str(error) if error is not None else "",
+        }
+
+    def _summarize(self, summaries):
+        print("\nSummary per sitemap root:")
+        for summary in summaries:
+            line = (f"{summary['root_url']}: {summary['urls']} URLs, {summary['client_errors']} 4xx, "
+                    f"{summary['server_errors']} 5xx, {summary['inaccessible']} inaccessible, "
+                    f"{summary['dead_sitemaps']} dead sitemaps")
+            if summary["error"]:
+                line += f" (stopped early: {summary['error']})"
+            print(f"  {line}")
+            logging.info(line)
+        totals = Counter()
+        for summary in summaries:
+            totals.update({key: value for key, value in summary.items() if isinstance(value, int)})
+        msg = (f"All roots: {totals['urls']} URLs, {totals['client_errors']} 4xx, {totals['server_errors']} 5xx, "
+               f"{totals['inaccessible']} inaccessible, {totals['dead_sitemaps']} dead sitemaps")
+        print(msg)
+        logging.info(msg)
+
+        with open(self.config.roots_summary_csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(summaries[0]) if summaries else ["root_url"])
+            writer.writeheader()
+            writer.writerows(summaries)
+        logging.info(f"Exported root summary to {self.config.roots_summary_csv}")
+
+    @staticmethod
+    def get_resume_info(sitemap_urls):
+        """Returns {sitemap_url: URLs already checked} for the roots with a previous run state."""
+        info = {}
+        for sitemap_url in sitemap_urls:
+            state_db = Config(sitemap_url, root_name=root_dir_name(sitemap_url)).state_db
+            if not os.path.exists(state_db):
+                continue
+            try:
+                store = StateStore(state_db)
+                try:
+                    info[sitemap_url] = store.checked_count()
+                finally:
+                    store.close()
+            except Exception:
+                continue
+        return info
@@ -1,19 +1,38 @@
 import os
 import csv
+import time
 import logging
-from urllib.parse import unquote
+from itertools import count
+from app.report_writer import ReportWriter
+from app.sitemap_rollup import SitemapRollup
+from app.state_store import StateStore
+from app.url_cache import UrlCache
+from app.url_dedup import UrlDeduplicator
 
 class ReportManager:
-    """Handles CSV reading/writing and directory management."""
+    """Handles run state, CSV exports and directory management."""
     def __init__(self, config):
         self.config = config
         self.max_depth = 0
+        self.sitemap_tree = None
+        self.store = None
+        self.rollup = None  # Per-sitemap result counts, kept up to date by the report writer
+        self.url_cache = None
+        self.writer = None
+        self._ids = count()  # Report row ids, continued from the stored count on resume
+        self.write_seconds = 0.0   # Time spent storing result batches
+        self.export_seconds = 0.0  # Time spent exporting the check CSVs
+        self.deduplicator = UrlDeduplicator(self._append_duplicate_result)
         os.makedirs(self.config.reports_dir, exist_ok=True)
 
     def set_max_depth(self, max_depth):
         """Sets the maximum sitemap depth for column generation."""
         self.max_depth = max_depth
 
+    def set_sitemap_tree(self, sitemap_tree):
+        """Sets the SitemapTree used to map sitemap node ids into the state store."""
+        self.sitemap_tree = sitemap_tree
+
     def prepare_environment(self):
         """Clears previous data if not resuming."""
         if not self.config.resume:
@@ -40,100 +59,208 @@ class ReportManager:
         return header
 
     def load_checked_urls(self):
-        """Loads state from the previous CSV report."""
-        checked_urls = set()
-        url_statuses = []
-
-        if self.config.resume and os.path.exists(self.config.url_checks_csv):
-            msg = f"Loading state from {self.config.url_checks_csv}..."
+        """Opens the state store and returns how many URLs were already checked."""
+        resuming = self.config.resume and os.path.exists(self.config.state_db)
+        if self.config.resume and not resuming:
+            msg = f"Resume requested but {self.config.state_db} not found. Starting from scratch."
             print(msg)
             logging.info(msg)
 
-            with open(self.config.url_checks_csv, "r", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                header = next(reader, None)  # Read header to determine structure
-                if header:
-                    # Find the index of 'url' and 'http_response_code' columns
-                    url_idx = header.index("url") if "url" in header else -1
-                    code_idx = header.index("http_response_code") if "http_response_code" in header else -1
-
-                    # Determine max_depth from header (count sitemap_l columns)
-                    sitemap_cols = [col for col in header if col.startswith("sitemap_l")]
-                    if sitemap_cols and self.max_depth == 0:
-                        self.max_depth = len(sitemap_cols)
-
-                    count = 0
-                    for row in reader:
-                        if len(row) > max(url_idx, code_idx) and url_idx >= 0 and code_idx >= 0:
-                            url = unquote(row[url_idx]).strip()
-                            code = int(row[code_idx])
-                            # Extract sitemap path from row
-                            sitemap_path = []
-                            for i, col in enumerate(header):
-                                if col.startswith("sitemap_l") and i < len(row):
-                                    sitemap_path.append(row[i])
-                            checked_urls.add(url)
-                            url_statuses.append((url, code, sitemap_path))
-                            count += 1
-
-            msg = f"State loaded. {count} URLs already checked."
-            print(f"{msg}\n")
-            logging.info(msg)
+        if resuming:
+            msg = f"Loading state from {self.config.state_db}..."
         else:
-            self._initialize_new_report()
+            msg = "Initializing new URL check state..."
+        print(msg)
+        logging.info(msg)
 
-        return checked_urls, url_statuses
+        self.open_store()
+        checked_count = self.store.checked_count()
+        self._ids = count(checked_count)
 
-    def _initialize_new_report(self):
-        if self.config.resume:
-            msg = f"Resume requested but {self.config.url_checks_csv} not found. Starting from scratch."
-            print(msg)
+        # The per-URL cache outlives individual runs (it is not in the reports directory)
+        os.makedirs(self.config.cache_dir, exist_ok=True)
+        self.url_cache = UrlCache(self.config.url_cache_db)
+
+        if resuming:
+            msg = f"State loaded. {checked_count} URLs already checked."
+            print(f"{msg}\n")
             logging.info(msg)
+        return checked_count
 
-        msg = "Initializing new URL check report..."
-        print(msg)
-        logging.info(msg)
+    def open_store(self):
+        """Opens (or creates) the run state in the reports directory."""
+        self.store = StateStore(self.config.state_db, fsync=self.config.write_fsync)
+        self.rollup = SitemapRollup.load(self.store)
 
-        with open(self.config.url_checks_csv, "w", newline='', encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(self._get_csv_header())
+    def claim_url(self, url, node_id):
+        """True if url still needs a check in this run.
 
-        # Initialize failure report with reason column
-        with open(self.config.failed_urls_csv, "w", newline='', encoding="utf-8") as f:
-            writer = csv.writer(f)
-            header = self._get_csv_header()
-            header.append("failure_reason")
-            writer.writerow(header)
+        A URL is checked once no matter how many sitemaps list it; every other
+        occurrence gets a row with the same result. URLs stored by an earlier
+        (resumed) run only get rows for sitemaps they were not recorded under.
+        """
+        if not self.deduplicator.seen(url):
+            stored = self.store.stored_result(url)
+            if stored is not None:
+                if not self.store.has_occurrence(url, self.sitemap_tree.urls[node_id]):
+                    status_code, reason = stored
+                    self._append_duplicate_result(url, node_id, status_code, reason)
+                return False
+        return self.deduplicator.claim(url, node_id)
 
-    def append_check_result(self, index, url, status_code, sitemap_path):
-        """Appends a single check result to the CSV file."""
-        with open(self.config.url_checks_csv, "a", newline='', encoding="utf-8") as f:
-            writer = csv.writer(f)
-            row = [index]
-            # Pad sitemap_path to max_depth
-            padded_path = sitemap_path + [""] * (self.max_depth - len(sitemap_path))
-            row.extend(padded_path)
-            row.extend([url, status_code])
-            writer.writerow(row)
-
-    def append_failure_result(self, index, url, status_code, sitemap_path, reason):
-        """Appends a failed check result with reason to the failure report."""
-        # Check if file exists to handle resume cases where it might be missing
-        file_exists = os.path.exists(self.config.failed_urls_csv)
-
-        with open(self.config.failed_urls_csv, "a", newline='', encoding="utf-8") as f:
-            writer = csv.writer(f)
-            if not file_exists:
+    def cached_result(self, url):
+        """Returns the CacheEntry from earlier runs, or None."""
+        return self.url_cache.get(url)
+
+    def status_counts(self):
+        """Returns {status_code: count} over every stored result (from the rollup; no table scan)."""
+        return self.rollup.status_counts()
+
+    def start_writer(self):
+        """Starts the background writer that stores check results in batches."""
+        self.writer = ReportWriter(
+            # Each batch is committed as one transaction, so no separate flush step
+            self._write_rows,
+            batch_size=self.config.write_batch_size,
+            flush_interval=self.config.write_flush_interval
+        ).start()
+
+    def queue_depth(self):
+        """Results waiting for the report writer."""
+        return self.writer.queue_depth() if self.writer is not None else 0
+
+    def close(self):
+        """Stores all queued results and stops the writer."""
+        if self.writer is None:
+            return
+        try:
+            self.writer.close()
+            self.write_seconds += self.writer.write_seconds
+            logging.info(f"Report writer: {self.writer.rows_written} rows in {self.writer.write_seconds:.2f}s")
+        finally:
+            self.writer = None
+
+    def append_check_result(self, url, status_code, node_id, reason=None, lastmod=None, cached=None, headers=None,
+                            latency=None):
+        """Queues a single check result; failures (code 0) keep their reason.
+
+        HTTP validators from the response headers (falling back to the cached
+        ones after a 304) and the sitemap lastmod are kept for incremental runs;
+        the latency of the final request goes into the sitemap rollup.
+        """
+        if status_code != 0:
+            reason = None
+        etag = headers.get("ETag") if headers else None
+        last_modified = headers.get("Last-Modified") if headers else None
+        if cached:
+            etag = etag or cached.etag
+            last_modified = last_modified or cached.last_modified
+        self.writer.submit((
+            next(self._ids), url, status_code, node_id, reason, time.time(),
+            lastmod, etag, last_modified, False, latency
+        ))
+        self.deduplicator.resolve(url, status_code, reason)
+
+    def append_cached_result(self, url, node_id, cached):
+        """Queues a result taken from the URL cache without a request (incremental mode)."""
+        # The cache entry keeps its original check time so the TTL still runs out
+        self.writer.submit((
+            next(self._ids), url, cached.status, node_id, None, time.time(),
+            cached.lastmod, cached.etag, cached.last_modified, True, None
+        ))
+        self.deduplicator.resolve(url, cached.status, None)
+
+    def _append_duplicate_result(self, url, node_id, status_code, reason):
+        """Queues the result of an already checked URL for another sitemap it appears in."""
+        # Marked like a cached result: the URL cache already has this URL's entry
+        self.writer.submit((
+            next(self._ids), url, status_code, node_id, reason, time.time(),
+            None, None, None, True, None
+        ))
+
+    def _write_rows(self, rows):
+        """Runs on the writer thread: stores a batch of results in one transaction each."""
+        self.store.write_checks([row[:6] + row[10:] for row in rows], self.sitemap_tree, rollup=self.rollup)
+        self.url_cache.write([
+            (url, status_code, checked_at, etag, last_modified, lastmod)
+            for _, url, status_code, _, _, checked_at, lastmod, etag, last_modified, from_cache, _ in rows
+            if not from_cache
+        ])
+
+    def export_check_reports(self):
+        """Exports url_checks.csv and failed_urls.csv from the state store."""
+        started = time.perf_counter()
+        self.max_depth = max(self.max_depth, self.store.max_depth())
+        sitemap_paths = self.store.sitemap_paths()
+
+        for csv_path, failures_only in ((self.config.url_checks_csv, False), (self.config.failed_urls_csv, True)):
+            with open(csv_path, "w", newline='', encoding="utf-8") as f:
+                writer = csv.writer(f)
                 header = self._get_csv_header()
-                header.append("failure_reason")
+                if failures_only:
+                    # Failure report with reason column
+                    header.append("failure_reason")
                 writer.writerow(header)
 
-            row = [index]
-            # Pad sitemap_path to max_depth
-            padded_path = sitemap_path + [""] * (self.max_depth - len(sitemap_path))
-            row.extend(padded_path)
-            row.extend([url, status_code, reason])
-            writer.writerow(row)
+                for index, url, sitemap_id, status_code, reason in self.store.iter_checks(failures_only):
+                    sitemap_path = sitemap_paths.get(sitemap_id, [])
+                    row = [index]
+                    # Pad sitemap_path to max_depth
+                    padded_path = sitemap_path + [""] * (self.max_depth - len(sitemap_path))
+                    row.extend(padded_path)
+                    row.extend([url, status_code])
+                    if failures_only:
+                        row.append(reason)
+                    writer.writerow(row)
+            logging.info(f"Exported check results to {csv_path}")
+        self.export_seconds += time.perf_counter() - started
+
+    def export_sitemap_rollup(self):
+        """Exports sitemap_rollup.csv: result counts and latencies per sitemap, including the sitemaps below it."""
+        sitemaps = list(self.store.iter_sitemaps())
+        levels = {}
+        for sitemap_id, _, parent_id in sitemaps:
+            levels[sitemap_id] = levels[parent_id] + 1 if parent_id in levels else 0
+        totals = self.rollup.rolled_up((sitemap_id, parent_id) for sitemap_id, _, parent_id in sitemaps)
+
+        with open(self.config.sitemap_rollup_csv, mode="w", newline='', encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([
+                "sitemap_url", "tree_level", "urls", "own_urls", "ok", "client_errors", "server_errors",
+                "inaccessible", "status_counts", "failure_reasons", "requests", "latency_mean",
+                "latency_p50", "latency_p90", "latency_p99", "latency_max"
+            ])
+            for sitemap_id, url, _ in sitemaps:
+                stats = totals[sitemap_id]
+                own = self.rollup.stats.get(sitemap_id)
+                statuses = stats.statuses
+                count = stats.latency_count
+                writer.writerow([
+                    url, levels[sitemap_id], sum(statuses.values()), sum(own.statuses.values()) if own else 0,
+                    sum(n for status, n in statuses.items() if 0 < status < 400),
+                    sum(n for status, n in statuses.items() if 400 <= status < 500),
+                    sum(n for status, n in statuses.items() if status >= 500),
+                    statuses.get(0, 0),
+                    ";".join(f"{status}:{n}" for status, n in sorted(statuses.items())),
+                    ";".join(f"{kind}:{n}" for kind, n in stats.failures.most_common()),
+                    count,
+                    f"{stats.latency_total / count:.3f}" if count else "",
+                    stats.latency_quantile(0.5) if count else "",
+                    stats.latency_quantile(0.9) if count else "",
+                    stats.latency_quantile(0.99) if count else "",
+                    f"{stats.latency_max:.3f}" if count else "",
+                ])
+        logging.info(f"Exported sitemap rollup to {self.config.sitemap_rollup_csv}")
+
+    def close_store(self):
+        if self.store is not None:
+            # A rollup rebuilt from an older run state is saved even if no batch followed
+            self.store.write_rollup(self.rollup)
+            self.store.close()
+            self.store = None
+        if self.url_cache is not None:
+            self.url_cache.close()
+            self.url_cache = None
 
     def export_dead_sitemaps(self, inaccessible_sitemaps):
         with open(self.config.dead_sitemaps_csv, mode="w", newline='', encoding="utf-8") as f:
@@ -149,4 +276,4 @@ class ReportManager:
             writer.writerow(["sitemap_url", "tree_level"])
             for url, level in sitemap_levels.items():
                 writer.writerow([url, level])
-        logging.info(f"Exported sitemap levels to {self.config.sitemap_levels_csv}")
\ No newline at end of file
+        logging.info(f"Exported sitemap levels to {self.config.sitemap_levels_csv}")
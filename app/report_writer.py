@@ -0,0 +1,83 @@
+import queue
+import threading
+import time
+import logging
+
+_CLOSE = object()  # Shutdown marker on the row queue
+
+class ReportWriter:
+    """Writes report rows from a background thread in batches.
+
+    Rows are handed to `write_batch` once `batch_size` rows are queued or
+    `flush_interval` seconds have passed, followed by `flush` (if given). A crash therefore
+    loses at most the rows of one unflushed batch.
+    """
+    def __init__(self, write_batch, flush=None, batch_size=500, flush_interval=1.0, max_queued=None):
+        self.write_batch = write_batch
+        self.flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Bounded so a slow disk applies backpressure instead of growing memory
+        self._queue = queue.Queue(maxsize=max_queued or batch_size * 20)
+        self._thread = threading.Thread(target=self._run, name="report-writer", daemon=True)
+        self._error = None
+        self.rows_written = 0
+        self.write_seconds = 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, row):
+        """Queues a row; blocks only if the writer has fallen far behind."""
+        if self._error is not None:
+            raise RuntimeError("Report writer failed") from self._error
+        self._queue.put(row)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def close(self):
+        """Writes every queued row, then stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("Report writer failed") from self._error
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    row = None
+
+                if row is _CLOSE:
+                    self._write(batch)
+                    return
+                if row is not None:
+                    batch.append(row)
+
+                if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                    self._write(batch)
+                    batch = []
+                    deadline = time.monotonic() + self.flush_interval
+        except Exception as e:
+            logging.error(f"Report writer stopped: {e}")
+            self._error = e
+            # Keep draining so producers blocked on a full queue are released
+            while self._queue.get() is not _CLOSE:
+                pass
+
+    def _write(self, batch):
+        if not batch:
+            return
+        started = time.perf_counter()
+        self.write_batch(batch)
+        if self.flush is not None:
+            self.flush()
+        self.write_seconds += time.perf_counter() - started
+        self.rows_written += len(batch)
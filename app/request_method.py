@@ -0,0 +1,45 @@
+import logging
+import threading
+
+# Statuses with which servers reject a HEAD request they do not implement
+HEAD_UNSUPPORTED_STATUSES = frozenset({405, 501})
+
+
+class RequestMethodSelector:
+    """Chooses between HEAD and a streamed GET per host.
+
+    With head_first, URLs are checked with HEAD so no body is sent at all. A
+    HEAD answered with an error status is repeated as GET before the URL is
+    reported: 405/501 mean the server does not implement HEAD, and some
+    servers answer HEAD differently from GET. Such hosts are remembered and get
+    GET from then on, as do the hosts in get_only_hosts.
+    """
+    def __init__(self, head_first=False, get_only_hosts=()):
+        self.head_first = head_first
+        self._get_only_hosts = set(get_only_hosts)
+        self._lock = threading.Lock()
+        self.fallbacks = 0  # HEAD results that were repeated as GET
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(head_first=config.head_first, get_only_hosts=config.get_only_hosts)
+
+    def method_for(self, host):
+        if self.head_first and host not in self._get_only_hosts:
+            return "HEAD"
+        return "GET"
+
+    @staticmethod
+    def needs_get(status_code):
+        """True if a HEAD result has to be confirmed with GET."""
+        return status_code >= 400
+
+    def record_fallback(self, host, head_status, get_status):
+        """Records a HEAD result that was repeated as GET; hosts that mishandle HEAD switch to GET."""
+        with self._lock:
+            self.fallbacks += 1
+            if host in self._get_only_hosts:
+                return
+            if head_status in HEAD_UNSUPPORTED_STATUSES or head_status != get_status:
+                self._get_only_hosts.add(host)
+                logging.info(f"HEAD unreliable on {host} (HEAD {head_status}, GET {get_status}); using GET from now on")
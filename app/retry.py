@@ -0,0 +1,95 @@
+import heapq
+import itertools
+import time
+from app.circuit_breaker import CircuitOpenError
+
+
+# Kinds of request errors that can be listed in retry_errors; "other" is any
+# exception that matches none of the HTTP client's kinds (e.g. an invalid URL)
+ERROR_KINDS = ("connection", "timeout", "tls", "other")
+
+
+class RetryPolicy:
+    """Decides whether a failed check is retried, after what delay and with which timeout.
+
+    error_kinds are the HTTP client's (kind, exception types) pairs, most
+    specific first; an error counts as the first kind it matches.
+    """
+    def __init__(self, timeouts=(10, 15, 25, 40), delays=(5, 10, 15), retry_statuses=(),
+                 retry_errors=("connection", "timeout"), error_kinds=()):
+        if len(delays) < len(timeouts) - 1:
+            raise ValueError("RetryPolicy needs one delay per retry attempt")
+        # timeouts[n] is the request timeout of attempt n; delays[n - 1] is the wait before it
+        self.timeouts = tuple(timeouts)
+        self.delays = tuple(delays)
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_errors = frozenset(retry_errors)
+        self.error_kinds = tuple(error_kinds)
+
+    @classmethod
+    def from_config(cls, config, error_kinds=()):
+        return cls(
+            timeouts=config.retry_timeouts,
+            delays=config.retry_delays,
+            retry_statuses=config.retry_statuses,
+            retry_errors=config.retry_errors,
+            error_kinds=error_kinds
+        )
+
+    @property
+    def max_attempts(self):
+        return len(self.timeouts)
+
+    def timeout_for(self, attempt):
+        return self.timeouts[attempt]
+
+    def delay_before(self, attempt, retry_after=None):
+        """Backoff before attempt; a longer Retry-After from the server wins."""
+        delay = self.delays[attempt - 1]
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def should_retry(self, attempt, status_code, error, congested=False):
+        """True if attempt number `attempt` (0-based) ended in a retryable outcome.
+
+        congested marks a 429/503 seen while a host controller paces the host;
+        it is retried whatever retry_statuses says.
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if error is not None:
+            # An open circuit fails the URL at once; retrying would only wait for the probe
+            return self.error_kind(error) in self.retry_errors and not isinstance(error, CircuitOpenError)
+        return congested or status_code in self.retry_statuses
+
+    def error_kind(self, error):
+        for kind, types in self.error_kinds:
+            if isinstance(error, types):
+                return kind
+        return "other"
+
+
+class DelayQueue:
+    """Time-ordered heap of items that become ready once their delay has expired."""
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()  # Tie-breaker so items are never compared
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, item, delay):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), item))
+
+    def pop_ready(self):
+        """Removes and returns every item whose delay has expired, oldest first."""
+        now = time.monotonic()
+        ready = []
+        while self._heap and self._heap[0][0] <= now:
+            ready.append(heapq.heappop(self._heap)[2])
+        return ready
+
+    def time_until_next(self):
+        """Seconds until the next item is ready, or None when the queue is empty."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
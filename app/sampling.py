@@ -0,0 +1,253 @@
+import os
+import csv
+import math
+import random
+import logging
+from statistics import NormalDist
+from app.check_runner import CheckRunner
+from app.config import Config
+from app.http_session import SessionPool
+from app.logger_setup import LoggerSetup
+from app.metrics import Metrics
+from app.report_manager import ReportManager
+from app.sitemap_crawler import SitemapCrawler
+
+
+def is_dead(status_code):
+    """Failures (code 0) and 4xx/5xx responses count as dead links."""
+    return status_code == 0 or status_code >= 400
+
+
+def _wilson(rate, n, z):
+    """Wilson score interval for a proportion observed in n (possibly effective) trials."""
+    if n <= 0:
+        return 0.0, 1.0
+    denominator = 1 + z * z / n
+    centre = (rate + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / n + z * z / (4 * n * n)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+class Stratum:
+    """The sampled page URLs of one sitemap: a fixed-size uniform reservoir and its results."""
+    __slots__ = ("population", "reservoir", "taken", "sampled", "dead")
+
+    def __init__(self):
+        self.population = 0  # Page URLs the sitemap lists
+        self.reservoir = []
+        self.taken = 0       # Reservoir entries handed out for checking
+        self.sampled = 0
+        self.dead = 0
+
+
+def stratified_estimate(strata, z):
+    """Returns (population, sampled, dead, rate, ci_low, ci_high) over several strata.
+
+    Each sitemap's rate is weighted by its page count; the interval is a
+    Wilson interval on the effective sample size of the stratified estimate.
+    The finite population correction narrows it as the sample covers more of
+    a sitemap; sampling every page gives the exact rate.
+    """
+    population = sum(stratum.population for stratum in strata)
+    sampled = sum(stratum.sampled for stratum in strata)
+    dead = sum(stratum.dead for stratum in strata)
+    measured = [stratum for stratum in strata if stratum.sampled]
+    if not measured:
+        return population, 0, 0, None, 0.0, 1.0
+    weight_total = sum(stratum.population for stratum in measured)
+    rate = 0.0
+    variance = 0.0
+    for stratum in measured:
+        weight = stratum.population / weight_total
+        stratum_rate = stratum.dead / stratum.sampled
+        rate += weight * stratum_rate
+        if stratum.sampled < stratum.population:
+            fpc = (stratum.population - stratum.sampled) / max(stratum.population - 1, 1)
+            variance += weight * weight * stratum_rate * (1 - stratum_rate) / stratum.sampled * fpc
+    if all(stratum.sampled >= stratum.population for stratum in measured):
+        return population, sampled, dead, rate, rate, rate
+    if 0 < rate < 1 and variance > 0:
+        effective_n = rate * (1 - rate) / variance
+    else:
+        effective_n = sampled
+    low, high = _wilson(rate, effective_n, z)
+    return population, sampled, dead, rate, low, high
+
+
+class _SampleResults:
+    """Receives engine results for the sample and counts them per sitemap."""
+    def __init__(self, scan):
+        self.scan = scan
+
+    def append_check_result(self, url, status_code, node_id, reason=None, lastmod=None, cached=None, headers=None,
+                            latency=None):
+        # node_id is the tuple of every sampled sitemap that drew this URL
+        self.scan.record(url, status_code, reason, node_id)
+
+
+class SampleScan:
+    """Quick health estimate from a stratified random sample of page URLs.
+
+    The sitemap tree is crawled in full, but only sample_size random page
+    URLs per sitemap are checked. With sample_expand_rounds, sitemaps whose
+    sample found dead links get another sample_size URLs per round. Dead-link
+    rates are reported per sitemap (sub-trees combined by page count) with
+    confidence intervals. Reports and logs go to reports/sample/ and
+    log/sample/; the state of a full run is not touched.
+    """
+    def __init__(self, sitemap_url, root_name=None, **config_options):
+        sample_root = os.path.join(root_name, "sample") if root_name else "sample"
+        self.config = Config(sitemap_url, root_name=sample_root, **config_options)
+        self.sample_size = self.config.sample_size
+        self.z = NormalDist().inv_cdf(0.5 + self.config.sample_confidence / 2)
+        self.rng = random.Random(self.config.sample_seed)
+        # Sample runs start over every time; they have no resume state
+        ReportManager(self.config).prepare_environment()
+        LoggerSetup.setup(self.config)
+
+        self.session_pool = SessionPool.from_config(self.config)
+        self.metrics = Metrics()
+        self.crawler = SitemapCrawler(
+            self.session_pool,
+            num_workers=self.config.crawl_workers,
+            queue_size=self.config.crawl_queue_size,
+            metrics=self.metrics
+        )
+        self.strata = {}   # sitemap node id -> Stratum
+        self.results = {}  # url -> (status_code, failure reason)
+        self.rows = []     # (round, node id, url, status_code, reason) for the sample report
+        self.round = 0
+
+    def run(self):
+        msg = (f"QUICK SCAN: {self.sample_size} random page URLs per sitemap of {self.config.sitemap_url} "
+               f"({self.config.sample_confidence:.0%} confidence intervals)")
+        print(f"\n{msg}\n")
+        logging.info(msg)
+
+        capacity = self.sample_size * (self.config.sample_expand_rounds + 1)
+        for url, node_id, _ in self.crawler.stream(self.config.sitemap_url):
+            self._add(url, node_id, capacity)
+        for stratum in self.strata.values():
+            # The reservoir is a uniform sample; shuffled, any prefix of it is one too
+            self.rng.shuffle(stratum.reservoir)
+
+        runner = CheckRunner(self.config, self.session_pool, self.metrics)
+        selected = set(self.strata)
+        try:
+            while selected and self.round <= self.config.sample_expand_rounds:
+                checked = self._check_round(runner, selected)
+                msg = f"Sample round {self.round}: {checked} URLs checked in {len(selected)} sitemaps"
+                print(msg)
+                logging.info(msg)
+                self.round += 1
+                # Expand where the sample found dead links and more pages are left to draw
+                selected = {
+                    node_id for node_id in selected
+                    if self.strata[node_id].dead and self.strata[node_id].taken < len(self.strata[node_id].reservoir)
+                }
+        finally:
+            self.metrics.log_summary()
+            self.session_pool.close()
+        self.export_reports()
+
+    def _add(self, url, node_id, capacity):
+        stratum = self.strata.get(node_id)
+        if stratum is None:
+            stratum = self.strata[node_id] = Stratum()
+        stratum.population += 1
+        if len(stratum.reservoir) < capacity:
+            stratum.reservoir.append(url)
+        else:
+            index = self.rng.randrange(stratum.population)
+            if index < capacity:
+                stratum.reservoir[index] = url
+
+    def _check_round(self, runner, node_ids):
+        """Checks the next sample_size reservoir URLs of each sitemap; returns the requests sent."""
+        targets = {}  # url -> sitemap node ids that drew it this round
+        for node_id in sorted(node_ids):
+            stratum = self.strata[node_id]
+            urls = stratum.reservoir[stratum.taken:stratum.taken + self.sample_size]
+            stratum.taken += len(urls)
+            for url in urls:
+                targets.setdefault(url, []).append(node_id)
+
+        pending = []
+        for url, drawn_by in targets.items():
+            if url in self.results:
+                # Listed by several sitemaps; one request answers for all of them
+                status_code, reason = self.results[url]
+                self.record(url, status_code, reason, drawn_by)
+            else:
+                pending.append((url, tuple(drawn_by), None, None))
+        if pending:
+            runner.run(pending, _SampleResults(self))
+        return len(pending)
+
+    def record(self, url, status_code, reason, node_ids):
+        self.results[url] = (status_code, reason)
+        dead = is_dead(status_code)
+        for node_id in node_ids:
+            stratum = self.strata[node_id]
+            stratum.sampled += 1
+            stratum.dead += dead
+            self.rows.append((self.round, node_id, url, status_code, reason))
+
+    def estimates(self):
+        """Yields (node id, estimate) for every sitemap; an index combines the sitemaps below it."""
+        tree = self.crawler.tree
+        subtree_strata = {}
+        for node_id, stratum in self.strata.items():
+            current = node_id
+            while current >= 0:
+                subtree_strata.setdefault(current, []).append(stratum)
+                current = tree.parents[current]
+        for node_id in range(len(tree)):
+            yield node_id, stratified_estimate(subtree_strata.get(node_id, []), self.z)
+
+    def export_reports(self):
+        tree = self.crawler.tree
+        with open(self.config.sample_checks_csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["round", "sitemap_url", "url", "http_response_code", "failure_reason"])
+            for sample_round, node_id, url, status_code, reason in self.rows:
+                writer.writerow([sample_round, tree.urls[node_id], url, status_code, reason])
+        logging.info(f"Exported sampled checks to {self.config.sample_checks_csv}")
+
+        estimates = list(self.estimates())
+        with open(self.config.sample_estimates_csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([
+                "sitemap_url", "tree_level", "page_urls", "sampled", "dead",
+                "dead_rate", "ci_low", "ci_high"
+            ])
+            for node_id, (population, sampled, dead, rate, low, high) in estimates:
+                writer.writerow([
+                    tree.urls[node_id], tree.levels[node_id], population, sampled, dead,
+                    "" if rate is None else f"{rate:.4f}", f"{low:.4f}", f"{high:.4f}"
+                ])
+        logging.info(f"Exported sample estimates to {self.config.sample_estimates_csv}")
+        self._summarize(estimates)
+
+    def _summarize(self, estimates):
+        tree = self.crawler.tree
+        confidence = f"{self.config.sample_confidence:.0%}"
+        failing = [(node_id, estimate) for node_id, estimate in estimates if estimate[2] and node_id in self.strata]
+        if failing:
+            print("\nEstimated dead-link rates of the sitemaps with dead links in the sample:")
+        for node_id, (population, sampled, dead, rate, low, high) in failing:
+            print(f"  {tree.urls[node_id]}: {rate:.1%} ({confidence} CI {low:.1%}-{high:.1%}), "
+                  f"{dead} of {sampled} sampled, {population} page URLs")
+        if tree.urls:
+            population, sampled, dead, rate, low, high = estimates[0][1]
+            if rate is not None:
+                msg = (f"Estimated dead-link rate: {rate:.2%} ({confidence} CI {low:.2%}-{high:.2%}) "
+                       f"from {sampled} of {population} page URLs, {dead} dead")
+            else:
+                msg = f"No page URLs sampled from {population} page URLs"
+            print(msg)
+            logging.info(msg)
+        if self.crawler.inaccessible_sitemaps:
+            msg = f"{len(self.crawler.inaccessible_sitemaps)} sitemaps could not be fetched"
+            print(msg)
+            logging.info(msg)
@@ -0,0 +1,124 @@
+import os
+import csv
+import logging
+from itertools import count
+from app.config import Config
+from app.logger_setup import LoggerSetup
+from app.report_manager import ReportManager
+from app.sitemap_rollup import SitemapRollup
+from app.sitemap_tree import SitemapTree
+from app.state_store import StateStore
+
+class ShardMerger:
+    """Combines the reports of `--shard i/N` runs into the usual reports.
+
+    Shard states are read in shard order and renumbered, so report ids and
+    sitemap ids are consistent across the merged files.
+    """
+    def __init__(self, config, shard_count):
+        self.config = config
+        self.shard_configs = [
+            Config(config.sitemap_url, shard_index=index, shard_count=shard_count)
+            for index in range(shard_count)
+        ]
+
+    def merge(self):
+        """Writes the merged reports; returns False if a shard has no reports yet."""
+        if any(c.reports_dir == self.config.reports_dir for c in self.shard_configs):
+            # A single "shard" keeps its state in reports/ itself, which the merge would clear first
+            print("Error: --merge-shards needs at least 2 shards; a single shard already writes reports/.")
+            return False
+        missing = [c.reports_dir for c in self.shard_configs if not os.path.exists(c.state_db)]
+        if missing:
+            print(f"Error: no shard state found in {', '.join(missing)}.")
+            print("Run every shard (python run.py -s --shard i/N) before merging.")
+            return False
+
+        # Files in reports/ and log/ are replaced; shard subdirectories are kept
+        report_manager = ReportManager(self.config)
+        report_manager.prepare_environment()
+        LoggerSetup.setup(self.config)
+
+        msg = f"Merging {len(self.shard_configs)} shards into {self.config.reports_dir}..."
+        print(msg)
+        logging.info(msg)
+
+        tree = SitemapTree()
+        report_manager.set_sitemap_tree(tree)
+        report_manager.open_store()
+        dead_sitemaps = {}
+        sitemap_levels = {}
+        ids = count()
+        try:
+            for shard_config in self.shard_configs:
+                rows = self._merge_store(shard_config, report_manager.store, tree, ids)
+                logging.info(f"Merged {rows} results from {shard_config.reports_dir}")
+                # Every shard crawls the full tree, so these mostly repeat across shards
+                for row in self._read_csv(shard_config.dead_sitemaps_csv):
+                    dead_sitemaps.setdefault(row["url"], None)
+                for row in self._read_csv(shard_config.sitemap_levels_csv):
+                    sitemap_levels.setdefault(row["sitemap_url"], int(row["tree_level"]))
+
+            merged_ids = {url: sitemap_id for sitemap_id, url, _ in report_manager.store.iter_sitemaps()}
+            for shard_config in self.shard_configs:
+                self._merge_rollup(shard_config, report_manager.rollup, merged_ids)
+            report_manager.store.write_rollup(report_manager.rollup)
+
+            report_manager.set_max_depth(tree.max_depth)
+            report_manager.export_check_reports()
+            report_manager.export_dead_sitemaps(list(dead_sitemaps))
+            report_manager.export_sitemap_levels(sitemap_levels)
+            report_manager.export_sitemap_rollup()
+            msg = f"Merged {report_manager.store.checked_count()} results."
+            print(msg)
+            logging.info(msg)
+        finally:
+            report_manager.close_store()
+        return True
+
+    def _merge_store(self, shard_config, store, tree, ids):
+        """Copies one shard's results into store with new report ids; returns the row count."""
+        shard_store = StateStore(shard_config.state_db)
+        try:
+            node_ids = {}  # shard sitemap id -> merged tree node id
+            for sitemap_id, url, parent_id in shard_store.iter_sitemaps():
+                node_id = tree.node_id(url)
+                if node_id is None:
+                    node_id = tree.add(url, node_ids.get(parent_id, -1))
+                node_ids[sitemap_id] = node_id
+
+            batch_size = self.config.write_batch_size
+            merged = 0
+            batch = []
+            for url, sitemap_id, status_code, reason, checked_at in shard_store.iter_results():
+                batch.append((next(ids), url, status_code, node_ids.get(sitemap_id), reason, checked_at))
+                if len(batch) >= batch_size:
+                    store.write_checks(batch, tree)
+                    merged += len(batch)
+                    batch = []
+            if batch:
+                store.write_checks(batch, tree)
+                merged += len(batch)
+            return merged
+        finally:
+            shard_store.close()
+
+    @staticmethod
+    def _merge_rollup(shard_config, rollup, merged_ids):
+        """Adds one shard's per-sitemap rollup (with its latencies) to rollup, matching sitemaps by URL."""
+        shard_store = StateStore(shard_config.state_db)
+        try:
+            shard_urls = {sitemap_id: url for sitemap_id, url, _ in shard_store.iter_sitemaps()}
+            for sitemap_id, stats in SitemapRollup.load(shard_store).stats.items():
+                merged_id = merged_ids.get(shard_urls.get(sitemap_id))
+                if merged_id is not None:
+                    rollup.merge(merged_id, stats)
+        finally:
+            shard_store.close()
+
+    @staticmethod
+    def _read_csv(path):
+        if not os.path.exists(path):
+            return []
+        with open(path, newline='', encoding="utf-8") as f:
+            return list(csv.DictReader(f))
@@ -0,0 +1,75 @@
+import os
+import hashlib
+import logging
+import multiprocessing
+
+
+def shard_of(url, shard_count):
+    """Stable shard number of a (normalized) page URL; the same on every process and node."""
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def filter_shard(page_urls, shard_index, shard_count):
+    """Yields the (url, node_id, lastmod) items that belong to the given shard."""
+    for item in page_urls:
+        if shard_of(item[0], shard_count) == shard_index:
+            yield item
+
+
+def _run_shard(sitemap_url, resume, shard_index, shard_count, config_options):
+    # Imported here so a spawned process starts from a clean module state
+    from app.app import SitemapCheckerApp
+    app = SitemapCheckerApp(
+        sitemap_url, resume=resume, shard_index=shard_index, shard_count=shard_count, **config_options
+    )
+    app.run()
+
+
+class ShardLauncher:
+    """Runs every shard of a check in its own local process, then merges the shard reports."""
+    def __init__(self, sitemap_url, processes=None, resume=False, **config_options):
+        self.sitemap_url = sitemap_url
+        self.processes = processes or os.cpu_count() or 1
+        self.resume = resume
+        self.config_options = config_options
+
+    def run(self):
+        """Returns True if every shard finished and the reports were merged."""
+        from app.config import Config
+        from app.shard_merger import ShardMerger
+
+        if self.processes <= 1:
+            # One shard is the whole check: run it in this process with the usual reports, no merge
+            from app.app import SitemapCheckerApp
+            SitemapCheckerApp(self.sitemap_url, resume=self.resume, **self.config_options).run()
+            return True
+
+        print(f"Starting {self.processes} shard processes...")
+        processes = [
+            multiprocessing.Process(
+                target=_run_shard,
+                args=(self.sitemap_url, self.resume, index, self.processes, self.config_options),
+                name=f"shard-{index}"
+            )
+            for index in range(self.processes)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        finally:
+            # On Ctrl+C the shards stop too; wait so their state is written for --resume
+            for process in processes:
+                process.join()
+
+        failed = [process.name for process in processes if process.exitcode != 0]
+        if failed:
+            msg = f"Shards failed: {', '.join(failed)}. Fix the cause and rerun with --resume."
+            print(msg)
+            logging.error(msg)
+            return False
+
+        config = Config(self.sitemap_url, **self.config_options)
+        return ShardMerger(config, self.processes).merge()
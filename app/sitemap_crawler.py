@@ -1,52 +1,277 @@
-import requests
-import xml.etree.ElementTree as ET
+import os
+import queue
+import threading
 import logging
-from urllib.parse import unquote
+from concurrent.futures import ThreadPoolExecutor
+from app.crawl_snapshot import CrawlSnapshot, CrawlSnapshotWriter
+from app.metrics import Metrics
+from app.sitemap_parser import iter_response_entries
+from app.sitemap_tree import SitemapTree
+
+_DONE = object()  # End-of-crawl marker on the page URL queue
 
 class SitemapCrawler:
-    """Recursively crawls sitemaps."""
-    def __init__(self):
-        self.visited_sitemaps = set()
+    """Crawls sitemaps breadth-first, fetching child sitemaps concurrently."""
+    def __init__(self, session_pool, num_workers=8, queue_size=10000, metrics=None, snapshot_path=None):
+        self.session_pool = session_pool
+        self.metrics = metrics or Metrics()
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.tree = SitemapTree()
         self.inaccessible_sitemaps = []
-        self.all_page_urls = []  # Now stores (url, sitemap_path) tuples
-        self.sitemap_levels = {}
-        self.max_depth = 0
+        self.snapshot_path = snapshot_path  # Crawl snapshot for resumed runs (None: not recorded)
+        self._snapshot = None  # CrawlSnapshotWriter while a crawl is recorded
+        self._crawl_complete = False
+        self._listed_children = {}  # Re-fetched node id -> child sitemap urls it lists now
+        self._failed = set()  # Node ids whose fetch failed in the current crawl
+        self._stop = threading.Event()
 
-    def fetch_all(self, start_url):
-        print("Recursively fetching all page URLs from all sitemaps...")
-        self._collect_recursive(start_url, level=0, path=[start_url])
+    @property
+    def sitemap_levels(self):
+        return self.tree.sitemap_levels()
+
+    @property
+    def max_depth(self):
+        return self.tree.max_depth
+
+    def stream(self, start_url, resume=False, revalidate=False):
+        """Yields (url, sitemap node id, lastmod) tuples while the crawl is still running.
 
-        logging.info(f"Total sitemaps collected: {len(self.sitemap_levels)}")
-        logging.info(f"Total page URLs extracted: {len(self.all_page_urls)}")
+        The node id resolves to the sitemap path through self.tree. The tree,
+        sitemap_levels, max_depth and inaccessible_sitemaps are complete once the
+        generator is exhausted. With a snapshot_path the crawl is recorded as it
+        runs; resume replays the recorded sitemaps instead of fetching them again.
+        """
+        self._stop.clear()
+        if resume and self.snapshot_path and os.path.exists(self.snapshot_path):
+            items = self._resume(start_url, revalidate)
+        else:
+            items = self._fresh(start_url)
+
+        count = 0
+        try:
+            for item in items:
+                count += 1
+                yield item
+        finally:
+            # Also reached when the consumer stops early (e.g. limit_requests)
+            self._stop.set()
+            if self._snapshot is not None:
+                self._snapshot.close()
+                self._snapshot = None
+
+        logging.info(f"Total sitemaps collected: {len(self.tree)}")
+        logging.info(f"Total page URLs extracted: {count}")
         logging.info(f"Maximum sitemap depth: {self.max_depth}")
 
-        return self.all_page_urls, self.inaccessible_sitemaps, self.sitemap_levels, self.max_depth
+    def _fresh(self, start_url):
+        print("Recursively fetching all page URLs from all sitemaps...")
+        if self.snapshot_path:
+            self._snapshot = CrawlSnapshotWriter(self.snapshot_path)
+        yield from self._crawled(start_url=start_url)
+        if self._snapshot is not None and self._crawl_complete:
+            self._snapshot.complete(self.max_depth)
 
-    def _collect_recursive(self, url, level, path):
-        if url in self.visited_sitemaps:
+    def _resume(self, start_url, revalidate):
+        """Replays a recorded crawl; only unfinished (and, with revalidate, changed) sitemaps are fetched."""
+        recorded_root = CrawlSnapshot.root_url_of(self.snapshot_path)
+        if recorded_root != start_url:
+            msg = f"Crawl snapshot is for {recorded_root}, not {start_url}; crawling again."
+            print(msg)
+            logging.info(msg)
+            yield from self._fresh(start_url)
             return
+        snapshot = CrawlSnapshot.load(self.snapshot_path, self.tree)
+
+        refetch = snapshot.unfinished()
+        if revalidate:
+            refetch |= self._changed_sitemaps(snapshot)
+        msg = (f"Loaded crawl snapshot: {len(self.tree)} sitemaps, "
+               f"{len(self.tree) - len(refetch)} replayed, {len(refetch)} to fetch again")
+        print(msg)
+        logging.info(msg)
+
+        if not refetch and snapshot.complete:
+            # Nothing to fetch; the snapshot stays as it is
+            self.inaccessible_sitemaps.extend(snapshot.dead.values())
+            yield from self._replayed(snapshot, set(snapshot.finished))
+            return
+
+        recorded_size = snapshot.drop(refetch)
+        recorded_count = len(self.tree)
+        self._snapshot = CrawlSnapshotWriter(self.snapshot_path, append=True)
+        yield from self._crawled(refetch=refetch)
+        if not self._crawl_complete:
+            return
+
+        # Sitemaps no longer listed by a re-fetched parent are dropped with their subtrees
+        live = set()
+        for node_id in range(recorded_count):
+            parent_id = self.tree.parents[node_id]
+            if parent_id < 0 or (parent_id in live and (
+                    parent_id not in refetch or self.tree.urls[node_id] in self._listed_children[parent_id])):
+                live.add(node_id)
+        self.inaccessible_sitemaps.extend(url for node_id, url in snapshot.dead.items() if node_id in live)
+        yield from self._replayed(snapshot, (live & snapshot.finished) - refetch, end=recorded_size)
+        self._snapshot.complete(self.max_depth)
+
+    def _replayed(self, snapshot, node_ids, end=None):
+        count = 0
+        for item in snapshot.iter_pages(node_ids, end):
+            count += 1
+            yield item
+        self.metrics.crawl_event("sitemaps_replayed", len(node_ids))
+        self.metrics.crawl_event("page_urls_found", count)
 
-        self.visited_sitemaps.add(url)
-        self.sitemap_levels[url] = level
-        self.max_depth = max(self.max_depth, level + 1)
+    def _changed_sitemaps(self, snapshot):
+        """Node ids of recorded sitemaps that do not answer a conditional request with 304."""
+        candidates = [node_id for node_id in snapshot.finished if node_id not in snapshot.dead]
+        print(f"Revalidating {len(candidates)} sitemaps...")
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            unchanged = executor.map(
+                lambda node_id: self._unchanged(self.tree.urls[node_id], snapshot.validators.get(node_id)),
+                candidates
+            )
+            changed = {node_id for node_id, same in zip(candidates, unchanged) if not same}
+        msg = (f"Sitemap revalidation: {len(candidates) - len(changed)} unchanged, {len(changed)} changed, "
+               f"{len(snapshot.dead)} dead sitemaps tried again")
+        print(msg)
+        logging.info(msg)
+        return changed | set(snapshot.dead)
 
-        extracted_urls = self._fetch_and_parse(url)
-        for child_url in extracted_urls:
+    def _unchanged(self, url, validators):
+        etag, last_modified = validators or (None, None)
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        if not headers:
+            return False
+        try:
+            with self.session_pool.get(url, headers=headers, stream=True) as resp:
+                return resp.status_code == 304
+        except Exception as e:
+            logging.warning(f"Could not revalidate sitemap {url}: {e}")
+            return False
+
+    def _crawled(self, start_url=None, refetch=()):
+        """Runs the crawl thread and yields the page URLs it finds."""
+        page_urls = queue.Queue(maxsize=self.queue_size)
+        crawl_thread = threading.Thread(target=self._crawl, args=(page_urls, start_url, refetch), daemon=True)
+        crawl_thread.start()
+        while True:
+            item = page_urls.get()
+            if item is _DONE:
+                break
+            yield item
+        crawl_thread.join()
+
+    def _crawl(self, page_urls, start_url, refetch):
+        """Coordinator: visits sitemaps level by level and schedules their fetches.
+
+        Crawls the tree from start_url, or fetches the refetch node ids of an
+        already loaded tree again along with any new child sitemaps they list.
+        The sitemaps of one level are fetched concurrently; their results are
+        taken in node order, so levels, paths and the dead sitemap list do not
+        depend on which fetch finished first.
+        """
+        self._crawl_complete = False
+        self._listed_children = {}
+        self._failed = set()
+        wave = []
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+
+                def visit(url, parent_id):
+                    if url in self.tree:
+                        return
+                    node_id = self.tree.add(url, parent_id)
+                    self.metrics.crawl_event("sitemaps_discovered")
+                    if self._snapshot is not None:
+                        self._snapshot.sitemap(node_id, parent_id, url)
+                    wave.append(node_id)
+
+                if start_url is not None:
+                    visit(start_url, -1)
+                wave.extend(sorted(refetch))
+                while wave and not self._stop.is_set():
+                    futures = [
+                        (node_id, executor.submit(self._collect_sitemap, self.tree.urls[node_id], node_id, page_urls))
+                        for node_id in wave
+                    ]
+                    wave = []
+                    for node_id, future in futures:
+                        child_sitemaps, finished = future.result()
+                        if node_id in self._failed:
+                            self.inaccessible_sitemaps.append(self.tree.urls[node_id])
+                        if node_id in refetch:
+                            self._listed_children[node_id] = set(child_sitemaps)
+                        for child_url in child_sitemaps:
+                            visit(child_url, node_id)
+                        if finished and self._snapshot is not None:
+                            self._snapshot.finished(node_id)
+                self._crawl_complete = not wave
+
+                # Let queued fetches return without touching the network
+                self._stop.set()
+        except Exception as e:
+            logging.error(f"Sitemap crawl aborted: {e}")
+        finally:
+            self._put(page_urls, _DONE, force=True)
+
+    def _collect_sitemap(self, url, node_id, page_urls):
+        """Worker: fetches one sitemap and queues its page URLs.
+
+        Returns its child sitemaps and whether every entry was handled.
+        """
+        child_sitemaps = []
+        if self._stop.is_set():
+            return child_sitemaps, False
+
+        found = 0
+        finished = True
+        for child_url, lastmod in self._fetch_and_parse(url, node_id):
             if "_sitemap" in child_url:
-                new_path = path + [child_url]
-                self._collect_recursive(child_url, level + 1, new_path)
+                child_sitemaps.append(child_url)
+            elif not self._put(page_urls, (child_url, node_id, lastmod)):
+                finished = False
+                break
             else:
-                # Store tuple with full sitemap path (excluding the page URL itself)
-                self.all_page_urls.append((child_url, list(path)))
+                found += 1
+                if self._snapshot is not None:
+                    self._snapshot.page(node_id, child_url, lastmod)
+        self.metrics.crawl_event("page_urls_found", found)
+        self.metrics.crawl_event("sitemaps_done")
+        return child_sitemaps, finished
+
+    def _put(self, page_urls, item, force=False):
+        """Blocking put that gives up once the consumer has stopped reading."""
+        while force or not self._stop.is_set():
+            try:
+                page_urls.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                if force and self._stop.is_set():
+                    # Nobody is reading anymore; make room for the end marker
+                    try:
+                        page_urls.get_nowait()
+                    except queue.Empty:
+                        pass
+        return False
 
-    def _fetch_and_parse(self, url):
+    def _fetch_and_parse(self, url, node_id):
+        """Yields (loc, lastmod) entries while the sitemap body is still downloading."""
         try:
-            resp = requests.get(url)
-            resp.raise_for_status()
-            root = ET.fromstring(resp.content)
-            ns = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-            return [unquote(loc.text).strip() for loc in root.findall('.//ns:loc', ns) if loc.text]
+            with self.session_pool.get(url, stream=True) as resp:
+                resp.raise_for_status()
+                if self._snapshot is not None:
+                    self._snapshot.validators(node_id, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                yield from iter_response_entries(resp)
         except Exception as e:
             logging.error(f"Inaccessible sitemap: {url} ({e})")
-            self.inaccessible_sitemaps.append(url)
-            return []
\ No newline at end of file
+            self._failed.add(node_id)
+            self.metrics.crawl_event("sitemaps_failed")
+            if self._snapshot is not None:
+                self._snapshot.dead(node_id, url)
@@ -0,0 +1,93 @@
+import zlib
+import xml.etree.ElementTree as ET
+from app.url_normalizer import normalize_url
+
+GZIP_MAGIC = b"\x1f\x8b"
+CHUNK_SIZE = 64 * 1024
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def _sitemap_name(tag):
+    """Local name of a tag in the sitemap namespace (or without one); None for other namespaces.
+
+    Extensions such as <image:loc> must not be mistaken for the page's <loc>.
+    """
+    if tag.startswith("{"):
+        namespace, name = tag[1:].split("}", 1)
+        return name if namespace == SITEMAP_NS else None
+    return tag
+
+
+def _decompressed(chunks):
+    """Passes chunks through, gunzipping on the fly if the body is a .gz file.
+
+    Content-Encoding: gzip is already undone by requests; this handles sitemaps
+    served as gzip files (e.g. sitemap.xml.gz), detected by their magic bytes.
+    """
+    chunks = iter(chunks)
+    decompressor = None
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if decompressor is None:
+            if not chunk.startswith(GZIP_MAGIC):
+                yield chunk
+                yield from chunks
+                return
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Bound each output block; highly repetitive XML can inflate 100x or more
+        while chunk:
+            data = decompressor.decompress(chunk, CHUNK_SIZE)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+    if decompressor is not None:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+
+def iter_sitemap_entries(chunks):
+    """Incrementally parses a sitemap or sitemap index body.
+
+    Yields (loc, lastmod) for every <url>/<sitemap> entry as soon as it is
+    complete; lastmod is None when absent. Processed elements are cleared so
+    memory stays flat regardless of the sitemap size.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    root = None
+    depth = 0  # 1: <urlset>/<sitemapindex>, 2: <url>/<sitemap>, 3: their direct children
+    loc = lastmod = None
+
+    def entries():
+        nonlocal root, depth, loc, lastmod
+        for event, elem in parser.read_events():
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+            name = _sitemap_name(elem.tag)
+            if depth == 3:
+                if name == "loc":
+                    loc = elem.text
+                elif name == "lastmod":
+                    lastmod = elem.text.strip() if elem.text else None
+            elif depth == 2 and name in ("url", "sitemap"):
+                if loc:
+                    yield normalize_url(loc), lastmod
+                loc = lastmod = None
+                # Drop finished entries from the tree
+                root.clear()
+            depth -= 1
+
+    for chunk in _decompressed(chunks):
+        parser.feed(chunk)
+        yield from entries()
+    parser.close()
+    yield from entries()
+
+
+def iter_response_entries(resp):
+    """Streams a requests response (opened with stream=True) through iter_sitemap_entries."""
+    return iter_sitemap_entries(resp.iter_content(chunk_size=CHUNK_SIZE))
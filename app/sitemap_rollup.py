@@ -0,0 +1,160 @@
+import json
+from bisect import bisect_left
+from collections import Counter
+from app.metrics import LATENCY_BUCKETS
+
+# Failure reasons name hosts and URLs, so they are counted by kind to keep the
+# per-sitemap counters small. The first kind with a matching pattern wins.
+_FAILURE_KINDS = (
+    ("circuit_open", ("Circuit open",)),
+    ("timeout", ("timed out", "Timeout", "TimeoutError")),
+    ("dns", ("Name or service not known", "NameResolution", "getaddrinfo", "nodename nor servname",
+             "No address associated", "Temporary failure in name resolution")),
+    ("connection_refused", ("Connection refused",)),
+    ("ssl", ("SSL", "certificate")),
+    ("too_many_redirects", ("redirects", "TooManyRedirects")),
+    ("connection_reset", ("reset by peer", "Connection aborted", "RemoteDisconnected", "ServerDisconnected")),
+)
+
+
+def failure_kind(reason):
+    """Groups a failure reason into a short kind such as 'timeout' or 'dns'."""
+    if reason:
+        for kind, patterns in _FAILURE_KINDS:
+            if any(pattern in reason for pattern in patterns):
+                return kind
+    return "other"
+
+
+class SitemapStats:
+    """Result counts and a latency histogram for the report rows of one sitemap."""
+    __slots__ = ("statuses", "failures", "latency_buckets", "latency_count", "latency_total", "latency_max")
+
+    def __init__(self):
+        self.statuses = Counter()  # HTTP status -> rows (0 = failure)
+        self.failures = Counter()  # failure kind -> rows
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # Last bucket is +Inf
+        self.latency_count = 0     # Rows with a request; repeats and cached results have no latency
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def add(self, status_code, reason, latency=None):
+        self.statuses[status_code] += 1
+        if status_code == 0:
+            self.failures[failure_kind(reason)] += 1
+        if latency is not None:
+            self.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+            self.latency_count += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+
+    def merge(self, other):
+        self.statuses.update(other.statuses)
+        self.failures.update(other.failures)
+        self.latency_buckets = [a + b for a, b in zip(self.latency_buckets, other.latency_buckets)]
+        self.latency_count += other.latency_count
+        self.latency_total += other.latency_total
+        self.latency_max = max(self.latency_max, other.latency_max)
+
+    def latency_quantile(self, q):
+        """Upper bound of the histogram bucket holding the q-quantile (None if empty or beyond the last bucket)."""
+        rank = q * self.latency_count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+        return None
+
+    def to_json(self):
+        return json.dumps({
+            "statuses": {str(status): count for status, count in self.statuses.items()},
+            "failures": dict(self.failures),
+            "latency": [self.latency_count, self.latency_total, self.latency_max, self.latency_buckets],
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        stats = cls()
+        stats.statuses.update({int(status): count for status, count in data["statuses"].items()})
+        stats.failures.update(data["failures"])
+        stats.latency_count, stats.latency_total, stats.latency_max, buckets = data["latency"]
+        if len(buckets) == len(stats.latency_buckets):
+            stats.latency_buckets = buckets
+        return stats
+
+
+class SitemapRollup:
+    """Streaming per-sitemap aggregate of the stored results.
+
+    Keyed by the state store's stable sitemap ids and updated by the report
+    writer as each batch is stored; the sitemaps changed by a batch are saved
+    in the same transaction, so a resumed run reloads it instead of scanning
+    every result. Memory grows with the number of sitemaps, not URLs. Each
+    sitemap keeps only its own rows; rolled_up() adds them to the ancestors.
+    """
+    def __init__(self):
+        self.stats = {}      # store sitemap id -> SitemapStats
+        self._dirty = set()  # sitemap ids changed since the last save
+
+    @classmethod
+    def load(cls, store):
+        """Restores the rollup saved in the store.
+
+        Run states written before the rollup existed are counted from their
+        stored results once (without latencies) and saved with the next batch.
+        """
+        rollup = cls()
+        for sitemap_id, text in store.rollup_rows():
+            rollup.stats[sitemap_id] = SitemapStats.from_json(text)
+        if not rollup.stats and store.checked_count():
+            for url, sitemap_id, status_code, reason, checked_at in store.iter_results():
+                rollup.add(sitemap_id, status_code, reason)
+        return rollup
+
+    def add(self, sitemap_id, status_code, reason, latency=None):
+        if sitemap_id is None:
+            return
+        stats = self.stats.get(sitemap_id)
+        if stats is None:
+            stats = self.stats[sitemap_id] = SitemapStats()
+        stats.add(status_code, reason, latency)
+        self._dirty.add(sitemap_id)
+
+    def merge(self, sitemap_id, stats):
+        """Adds stats of another run state (e.g. a shard) to a sitemap."""
+        own = self.stats.get(sitemap_id)
+        if own is None:
+            own = self.stats[sitemap_id] = SitemapStats()
+        own.merge(stats)
+        self._dirty.add(sitemap_id)
+
+    def pop_dirty(self):
+        """Returns (sitemap_id, stats json) for the sitemaps changed since the last call."""
+        rows = [(sitemap_id, self.stats[sitemap_id].to_json()) for sitemap_id in self._dirty]
+        self._dirty.clear()
+        return rows
+
+    def status_counts(self):
+        """Returns {status_code: count} over every stored result."""
+        counts = Counter()
+        for stats in self.stats.values():
+            counts.update(stats.statuses)
+        return dict(counts)
+
+    def rolled_up(self, sitemaps):
+        """Returns {sitemap id: SitemapStats of the sitemap and everything below it}.
+
+        sitemaps are (id, parent_id) pairs with parents before children.
+        """
+        sitemaps = list(sitemaps)
+        totals = {sitemap_id: SitemapStats() for sitemap_id, _ in sitemaps}
+        for sitemap_id, stats in self.stats.items():
+            if sitemap_id in totals:
+                totals[sitemap_id].merge(stats)
+        # Children first, so every subtree is complete before it is added to its parent
+        for sitemap_id, parent_id in reversed(sitemaps):
+            if parent_id in totals:
+                totals[parent_id].merge(totals[sitemap_id])
+        return totals
@@ -0,0 +1,39 @@
+from array import array
+
+class SitemapTree:
+    """Stores every sitemap once as a parent-pointer node.
+
+    Page URLs carry the integer id of the sitemap they were found in; report
+    rows get their sitemap paths from the state store when they are exported.
+    """
+    def __init__(self):
+        self.urls = []               # node id -> sitemap url
+        self.parents = array("i")    # node id -> parent node id (-1 for a root)
+        self.levels = array("i")     # node id -> tree level (0 for a root)
+        self._ids = {}               # sitemap url -> node id
+
+    def __len__(self):
+        return len(self.urls)
+
+    def __contains__(self, url):
+        return url in self._ids
+
+    def add(self, url, parent_id=-1):
+        """Adds a sitemap below parent_id and returns its node id."""
+        node_id = len(self.urls)
+        self.urls.append(url)
+        self.parents.append(parent_id)
+        self.levels.append(self.levels[parent_id] + 1 if parent_id >= 0 else 0)
+        self._ids[url] = node_id
+        return node_id
+
+    def node_id(self, url):
+        return self._ids.get(url)
+
+    def sitemap_levels(self):
+        """Returns {sitemap_url: tree_level} in discovery order."""
+        return dict(zip(self.urls, self.levels))
+
+    @property
+    def max_depth(self):
+        return max(self.levels) + 1 if self.levels else 0
@@ -0,0 +1,188 @@
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checks (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    sitemap_id INTEGER,
+    status INTEGER NOT NULL,
+    reason TEXT,
+    checked_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS checks_url ON checks (url);
+CREATE TABLE IF NOT EXISTS sitemaps (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    parent_id INTEGER,
+    level INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS sitemap_rollup (
+    sitemap_id INTEGER PRIMARY KEY,
+    stats TEXT NOT NULL
+);
+"""
+
+
+class StateStore:
+    """Run state in SQLite (WAL mode): one row per checked URL, indexed by URL.
+
+    The report writer thread is the only writer; lookups from other threads go
+    through a separate read connection. Sitemaps get their own stable ids so
+    rows stay valid when a resumed crawl numbers the SitemapTree differently.
+    """
+    def __init__(self, db_path, fsync=False):
+        self.db_path = db_path
+        self.fsync = fsync
+        self._write_conn = None
+        self._read_conn = self._connect()
+        self._read_lock = threading.Lock()
+        self._read_conn.executescript(_SCHEMA)
+        self._sitemap_ids = {}  # SitemapTree node id -> store sitemap id
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is crash-safe in WAL mode but may lose the last commits on power loss
+        conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+        return conn
+
+    # --- Reads (any thread) ---
+
+    def stored_result(self, url):
+        """Returns (status, reason) of a stored result for url, or None."""
+        with self._read_lock:
+            return self._read_conn.execute(
+                "SELECT status, reason FROM checks WHERE url = ? LIMIT 1", (url,)
+            ).fetchone()
+
+    def has_occurrence(self, url, sitemap_url):
+        """True if a result for url found in the given sitemap is stored."""
+        with self._read_lock:
+            row = self._read_conn.execute(
+                "SELECT 1 FROM checks JOIN sitemaps ON sitemaps.id = checks.sitemap_id "
+                "WHERE checks.url = ? AND sitemaps.url = ? LIMIT 1",
+                (url, sitemap_url)
+            ).fetchone()
+        return row is not None
+
+    def checked_count(self):
+        with self._read_lock:
+            row = self._read_conn.execute("SELECT value FROM meta WHERE key = 'checked_count'").fetchone()
+        return int(row[0]) if row else 0
+
+    def max_depth(self):
+        with self._read_lock:
+            row = self._read_conn.execute("SELECT MAX(level) FROM sitemaps").fetchone()
+        return row[0] + 1 if row[0] is not None else 0
+
+    def sitemap_paths(self):
+        """Returns {sitemap id: [root url, ..., sitemap url]} for every stored sitemap."""
+        with self._read_lock:
+            rows = self._read_conn.execute("SELECT id, url, parent_id FROM sitemaps ORDER BY level").fetchall()
+        paths = {}
+        for sitemap_id, url, parent_id in rows:
+            paths[sitemap_id] = paths.get(parent_id, []) + [url]
+        return paths
+
+    def rollup_rows(self):
+        """Yields (sitemap_id, stats json) of the saved per-sitemap rollup."""
+        return self._iter_query("SELECT sitemap_id, stats FROM sitemap_rollup")
+
+    def iter_sitemaps(self):
+        """Yields (id, url, parent_id) for every stored sitemap, parents before children."""
+        return self._iter_query("SELECT id, url, parent_id FROM sitemaps ORDER BY level, id")
+
+    def iter_checks(self, failures_only=False):
+        """Yields (id, url, sitemap_id, status, reason) in report id order."""
+        query = "SELECT id, url, sitemap_id, status, reason FROM checks"
+        if failures_only:
+            query += " WHERE status = 0"
+        query += " ORDER BY id"
+        return self._iter_query(query)
+
+    def iter_results(self):
+        """Yields (url, sitemap_id, status, reason, checked_at) in report id order."""
+        return self._iter_query("SELECT url, sitemap_id, status, reason, checked_at FROM checks ORDER BY id")
+
+    def _iter_query(self, query):
+        # Own connection so a long export does not hold the read lock
+        conn = sqlite3.connect(self.db_path)
+        try:
+            yield from conn.execute(query)
+        finally:
+            conn.close()
+
+    # --- Writes (report writer thread only) ---
+
+    def write_checks(self, rows, sitemap_tree, rollup=None):
+        """Stores (index, url, status_code, node_id, reason, checked_at[, latency]) rows in one transaction.
+
+        With a SitemapRollup the rows are also counted per sitemap, and the
+        changed sitemaps are saved in the same transaction.
+        """
+        conn = self._writer()
+        with conn:
+            records = [
+                (index, url, self._sitemap_id(conn, sitemap_tree, node_id), status_code, reason, checked_at)
+                for index, url, status_code, node_id, reason, checked_at, *_ in rows
+            ]
+            conn.executemany(
+                "INSERT INTO checks (id, url, sitemap_id, status, reason, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                records
+            )
+            # Kept in the same transaction so the count never disagrees with the rows
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('checked_count', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + excluded.value",
+                (len(rows),)
+            )
+            if rollup is not None:
+                for (_, _, sitemap_id, status_code, reason, _), row in zip(records, rows):
+                    rollup.add(sitemap_id, status_code, reason, row[6] if len(row) > 6 else None)
+                self._save_rollup(conn, rollup.pop_dirty())
+
+    def write_rollup(self, rollup):
+        """Saves the sitemaps of rollup changed since it was last saved."""
+        conn = self._writer()
+        with conn:
+            self._save_rollup(conn, rollup.pop_dirty())
+
+    def _save_rollup(self, conn, rows):
+        conn.executemany(
+            "INSERT INTO sitemap_rollup (sitemap_id, stats) VALUES (?, ?) "
+            "ON CONFLICT(sitemap_id) DO UPDATE SET stats = excluded.stats",
+            rows
+        )
+
+    def _writer(self):
+        if self._write_conn is None:
+            self._write_conn = self._connect()
+        return self._write_conn
+
+    def _sitemap_id(self, conn, sitemap_tree, node_id):
+        """Maps a SitemapTree node id to a stable store id, storing its ancestors as needed."""
+        if node_id is None or node_id < 0:
+            return None
+        sitemap_id = self._sitemap_ids.get(node_id)
+        if sitemap_id is None:
+            parent_id = self._sitemap_id(conn, sitemap_tree, sitemap_tree.parents[node_id])
+            url = sitemap_tree.urls[node_id]
+            conn.execute(
+                "INSERT OR IGNORE INTO sitemaps (url, parent_id, level) VALUES (?, ?, ?)",
+                (url, parent_id, sitemap_tree.levels[node_id])
+            )
+            sitemap_id = conn.execute("SELECT id FROM sitemaps WHERE url = ?", (url,)).fetchone()[0]
+            self._sitemap_ids[node_id] = sitemap_id
+        return sitemap_id
+
+    def close(self):
+        if self._write_conn is not None:
+            self._write_conn.close()
+            self._write_conn = None
+        self._read_conn.close()
@@ -0,0 +1,88 @@
+import sqlite3
+import threading
+from collections import namedtuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    checked_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    lastmod TEXT
+);
+"""
+
+
+class CacheEntry(namedtuple("CacheEntry", "status checked_at etag last_modified lastmod")):
+    """Last known result for a URL, kept across runs."""
+    __slots__ = ()
+
+    def is_healthy(self):
+        return 200 <= self.status < 400
+
+    def conditional_headers(self):
+        """Request headers that let the origin answer 304 Not Modified."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers or None
+
+
+class UrlCache:
+    """Persistent per-URL results (status, validators, sitemap lastmod) for incremental runs.
+
+    Lives outside the reports directory so it survives fresh runs. Like the
+    StateStore, it is written by the report writer thread only.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._write_conn = None
+        self._read_conn = self._connect()
+        self._read_lock = threading.Lock()
+        self._read_conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, url):
+        with self._read_lock:
+            row = self._read_conn.execute(
+                "SELECT status, checked_at, etag, last_modified, lastmod FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    @staticmethod
+    def can_skip(entry, lastmod, ttl, now):
+        """True if the URL was healthy within ttl seconds and its sitemap lastmod is unchanged."""
+        return (
+            entry is not None
+            and entry.is_healthy()
+            and now - entry.checked_at < ttl
+            and lastmod is not None
+            and lastmod == entry.lastmod
+        )
+
+    def write(self, rows):
+        """Upserts (url, status, checked_at, etag, last_modified, lastmod) rows in one transaction."""
+        if not rows:
+            return
+        if self._write_conn is None:
+            self._write_conn = self._connect()
+        with self._write_conn as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO urls (url, status, checked_at, etag, last_modified, lastmod) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def close(self):
+        if self._write_conn is not None:
+            self._write_conn.close()
+            self._write_conn = None
+        self._read_conn.close()
@@ -1,66 +1,215 @@
-import requests
-import logging
 import time
+import requests
+from collections import deque
+from urllib.parse import urljoin
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.circuit_breaker import CircuitOpenError
+from app.retry import RetryPolicy, DelayQueue
+from app.host_limiter import CONGESTION_STATUSES, host_of, retry_after_of
+from app.http_session import drain_response
+from app.logger_setup import log_check
+from app.metrics import Metrics
+from app.request_method import RequestMethodSelector
+from app.url_dedup import RedirectCache
+from app.url_normalizer import canonical_url
+
+MAX_REDIRECTS = 30
+# URLs kept out of the workers (backing off, or waiting for a busy or paused host)
+# before the checker stops reading further ahead in the URL stream
+MAX_HELD_BACK = 10000
+# Errors that mean the host could not be reached at all (for the circuit breaker);
+# covers refused connections, DNS failures and connect timeouts, but not TLS errors
+CONNECTION_ERRORS = (requests.ConnectionError,)
+TLS_ERRORS = (requests.exceptions.SSLError,)
+# RetryPolicy error kinds; TLS and timeout errors are also ConnectionErrors, so they come first
+ERROR_KINDS = (
+    ("tls", TLS_ERRORS),
+    ("timeout", (requests.Timeout,)),
+    ("connection", (requests.ConnectionError, requests.exceptions.ChunkedEncodingError)),
+)
 
 class UrlChecker:
     """Performs HTTP checks on URLs."""
     @staticmethod
-    def check_urls(urls_to_check, start_index, report_manager, num_workers=5):
-        results = []
+    def check_urls(urls_to_check, report_manager, session_pool, num_workers=5, retry_policy=None,
+                   host_controller=None, redirect_cache=None, metrics=None, circuit_breaker=None,
+                   method_selector=None, drain_bytes=65536):
+        """Checks (url, node_id, lastmod, cache_entry) items; a cache entry makes the request conditional.
+
+        Results go to report_manager.append_check_result; returns how many were reported.
+        """
+        retry_policy = retry_policy or RetryPolicy(error_kinds=ERROR_KINDS)
+        redirect_cache = redirect_cache or RedirectCache()
+        metrics = metrics or Metrics()
+        method_selector = method_selector or RequestMethodSelector()
+        checked = 0
         print("Checking all page URLs...")
 
-        def check_single(args):
-            i, (url, sitemap_path) = args
-
-            def attempt_request(timeout):
-                try:
-                    resp = requests.get(url, allow_redirects=True, timeout=timeout)
-                    status_code = resp.status_code
-                    logging.debug(f"Checked {url}: {status_code} (path: {' -> '.join(sitemap_path)})")
-                    return status_code, None
-                except Exception as e:
-                    # Capture the reason
-                    logging.debug(f"Error checking {url}: {e} (path: {' -> '.join(sitemap_path)})")
-                    return 0, str(e)
-
-            # Try 1: Initial attempt (10s timeout)
-            timeout = 10
-            status_code, reason = attempt_request(timeout)
-
-            if status_code == 0:
-                # Try 2: Wait 5s, increase timeout by 5s (15s)
-                time.sleep(5)
-                timeout += 5
-                status_code, reason = attempt_request(timeout)
-
-                if status_code == 0:
-                    # Try 3: Wait 10s, increase timeout by 10s (25s)
-                    time.sleep(10)
-                    timeout += 10
-                    status_code, reason = attempt_request(timeout)
-
-                    if status_code == 0:
-                        # Try 4: Wait 15s, increase timeout by 15s (40s)
-                        time.sleep(15)
-                        timeout += 15
-                        status_code, reason = attempt_request(timeout)
-
-            return (i, url, status_code, sitemap_path, reason)
-
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            futures = {executor.submit(check_single, (i, pair)): i for i, pair in enumerate(urls_to_check)}
-            for future in tqdm(as_completed(futures), total=len(futures), desc="Checking URLs"):
-                i, url, status_code, sitemap_path, reason = future.result()
-
-                # Standard report (no reason column)
-                report_manager.append_check_result(start_index + i, url, status_code, sitemap_path)
-
-                # Failure report (only for code 0)
-                if status_code == 0:
-                    report_manager.append_failure_result(start_index + i, url, status_code, sitemap_path, reason)
-
-                results.append((url, status_code, sitemap_path))
-
-        return results
\ No newline at end of file
+        def attempt_request(url, node_id, attempt, cached):
+            """Runs one attempt; the host's slot was taken by the scheduling loop."""
+            host = host_of(url)
+            if circuit_breaker is not None and not circuit_breaker.allow(host):
+                if host_controller is not None:
+                    host_controller.cancel(host)
+                return 0, circuit_breaker.open_error(host), None, None
+            metrics.request_started()
+            started = time.monotonic()
+            status_code, error, headers, body_bytes = send_request(url, host, attempt, cached)
+            latency = time.monotonic() - started
+            metrics.request_finished(host, latency, body_bytes)
+            log_check(url, node_id, attempt, status_code, error, latency, body_bytes)
+            if circuit_breaker is not None:
+                circuit_breaker.record(host, error)
+            if host_controller is not None:
+                host_controller.release(host, status_code, error, latency, retry_after_of(status_code, headers))
+            return status_code, error, headers, latency
+
+        def send_request(url, host, attempt, cached):
+            """Returns (status, error, response headers, body bytes downloaded)."""
+            body_bytes = 0
+            timeout = retry_policy.timeout_for(attempt)
+            # A retry must reach the server; the cache could only repeat an earlier answer
+            use_cache = attempt == 0
+            try:
+                headers = cached.conditional_headers() if cached else None
+                method = method_selector.method_for(host)
+                status_code, resp_headers, body_bytes = fetch(method, url, timeout, headers, use_cache)
+                if method == "HEAD" and method_selector.needs_get(status_code):
+                    head_status = status_code
+                    status_code, resp_headers, get_bytes = fetch("GET", url, timeout, headers, use_cache)
+                    body_bytes += get_bytes
+                    method_selector.record_fallback(host, head_status, status_code)
+                return status_code, None, resp_headers, body_bytes
+            except Exception as e:
+                return 0, e, None, body_bytes
+
+        def fetch(method, url, timeout, headers, use_cache):
+            """Follows redirects by hand so final statuses of common targets are fetched only once.
+
+            Bodies are streamed and read up to drain_bytes; returns (status, headers, body bytes).
+            """
+            resp = session_pool.request(method, url, allow_redirects=False, timeout=timeout, headers=headers,
+                                        stream=True)
+            body_bytes = drain_response(resp, drain_bytes)
+            targets = []
+            while resp.is_redirect:
+                if len(targets) >= MAX_REDIRECTS:
+                    raise requests.TooManyRedirects(f"Exceeded {MAX_REDIRECTS} redirects.")
+                # Fetched as sent; only the cache key is canonicalized
+                target = urljoin(resp.url, resp.headers["Location"])
+                key = canonical_url(target)
+                known_status = redirect_cache.get(key) if use_cache else None
+                if known_status is not None:
+                    redirect_cache.put_all(targets, known_status)
+                    return known_status, None, body_bytes
+                targets.append(key)
+                resp = session_pool.request(method, target, allow_redirects=False, timeout=timeout, stream=True)
+                body_bytes += drain_response(resp, drain_bytes)
+            if method == "GET" or not method_selector.needs_get(resp.status_code):
+                # A HEAD error is not final until GET confirms it
+                redirect_cache.put_all(targets, resp.status_code)
+            return resp.status_code, resp.headers, body_bytes
+
+        # Workers only ever run single attempts. Failed attempts wait out their backoff
+        # in the delay queue, so the workers keep checking fresh URLs in the meantime.
+        # URLs of a host without a free slot are held back here too (paused or rate
+        # limited hosts) or in waiting (hosts at their concurrency limit), never in a worker.
+        retries = DelayQueue()
+        waiting = {}  # host -> deque of jobs waiting for one of the host's requests to finish
+        pending = {}  # future -> (item, attempt, outcome of the previous attempt)
+        items = iter(urls_to_check)
+        items_exhausted = False
+        max_pending = num_workers * 2
+        total = len(urls_to_check) if hasattr(urls_to_check, "__len__") else None
+
+        with ThreadPoolExecutor(max_workers=num_workers) as executor, \
+                tqdm(total=total, desc="Checking URLs") as progress:
+
+            def start(job):
+                (url, node_id, _lastmod, cached), attempt, _previous = job
+                future = executor.submit(attempt_request, url, node_id, attempt, cached)
+                pending[future] = job
+
+            def admit(host, job):
+                """Starts job if host has a free slot; False if it must wait for one of the host's requests."""
+                wait_seconds = host_controller.try_acquire(host) if host_controller is not None else 0
+                if wait_seconds is None:
+                    return False
+                if wait_seconds:
+                    # Paused (Retry-After) or rate limited: try again once the host is due
+                    retries.push(job, wait_seconds)
+                else:
+                    start(job)
+                return True
+
+            def submit(job):
+                host = host_of(job[0][0])
+                if host in waiting or not admit(host, job):
+                    waiting.setdefault(host, deque()).append(job)
+
+            def admit_waiting(host):
+                jobs = waiting.get(host)
+                while jobs and admit(host, jobs[0]):
+                    jobs.popleft()
+                if not jobs:
+                    waiting.pop(host, None)
+
+            while True:
+                # Retries whose backoff has expired go ahead of fresh URLs
+                for job in retries.pop_ready():
+                    submit(job)
+
+                while not items_exhausted and len(pending) < max_pending and \
+                        len(retries) + sum(map(len, waiting.values())) < MAX_HELD_BACK:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        items_exhausted = True
+                        break
+                    submit((item, 0, None))
+
+                if not pending:
+                    if items_exhausted and not retries and not waiting:
+                        break
+                    # Only backed-off retries are left
+                    time.sleep(retries.time_until_next())
+                    continue
+
+                done, _ = wait(pending, timeout=retries.time_until_next(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    item, attempt, previous = pending.pop(future)
+                    status_code, error, headers, latency = future.result()
+                    admit_waiting(host_of(item[0]))
+                    if previous is not None and isinstance(error, CircuitOpenError):
+                        # The circuit opened while this URL backed off; report what its request got
+                        status_code, error, headers, latency = previous
+
+                    # With a host controller, 429/503 mean "slow down": retried after the pause
+                    congested = host_controller is not None and status_code in CONGESTION_STATUSES
+                    if retry_policy.should_retry(attempt, status_code, error, congested):
+                        metrics.record_retry()
+                        retry_after = retry_after_of(status_code, headers) if congested else None
+                        retries.push(
+                            (item, attempt + 1, (status_code, error, headers, latency)),
+                            retry_policy.delay_before(attempt + 1, retry_after)
+                        )
+                        continue
+                    metrics.record_result(status_code, error)
+
+                    url, node_id, lastmod, cached = item
+                    if status_code == 304 and cached:
+                        # Not modified since the cached check
+                        status_code = cached.status
+
+                    # Failures (code 0) also end up in the failure report with their reason
+                    reason = str(error) if error is not None else None
+                    report_manager.append_check_result(
+                        url, status_code, node_id, reason, lastmod=lastmod, cached=cached, headers=headers,
+                        latency=latency
+                    )
+
+                    checked += 1
+                    progress.update(1)
+
+        return checked
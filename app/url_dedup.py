@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+from app.host_limiter import CONGESTION_STATUSES
+
+
+class UrlDeduplicator:
+    """Lets each unique URL be checked once per run and fans its result out to every sitemap.
+
+    The first occurrence of a URL is claimed for checking. Later occurrences are
+    parked until that check finishes, or written straight away if it already has.
+    """
+    def __init__(self, write_duplicate):
+        self.write_duplicate = write_duplicate  # callable(url, node_id, status_code, reason)
+        self._results = {}  # url -> list of parked node ids while pending, (status_code, reason) once done
+        self._shared = {}   # One (status_code, None) tuple per status, shared by all successful URLs
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def seen(self, url):
+        """True if url was already claimed in this run."""
+        return url in self._results
+
+    def claim(self, url, node_id):
+        """True if the caller should check url; False if it is a repeat occurrence."""
+        with self._lock:
+            result = self._results.get(url)
+            if result is None:
+                self._results[url] = []
+                return True
+            self.duplicates += 1
+            if isinstance(result, list):
+                result.append(node_id)
+                return False
+        status_code, reason = result
+        self.write_duplicate(url, node_id, status_code, reason)
+        return False
+
+    def resolve(self, url, status_code, reason):
+        """Records the result of a claimed URL and writes its parked occurrences."""
+        if status_code == 0:
+            result = (status_code, reason)
+        else:
+            result = self._shared.setdefault(status_code, (status_code, None))
+        with self._lock:
+            parked = self._results.get(url)
+            self._results[url] = result
+        for node_id in parked or ():
+            self.write_duplicate(url, node_id, status_code, reason)
+
+
+class RedirectCache:
+    """Bounded LRU of redirect target URL -> final status code, shared by all workers.
+
+    Statuses a retry could change (429/503, other 5xx and retry_statuses) are
+    not cached, so later URLs and retries ask the server again.
+    """
+    def __init__(self, max_size=100000, retry_statuses=()):
+        self.max_size = max_size
+        self.uncached_statuses = CONGESTION_STATUSES | frozenset(retry_statuses)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, url):
+        with self._lock:
+            status_code = self._entries.get(url)
+            if status_code is not None:
+                self._entries.move_to_end(url)
+                self.hits += 1
+            return status_code
+
+    def put_all(self, urls, status_code):
+        if status_code >= 500 or status_code in self.uncached_statuses:
+            return
+        with self._lock:
+            for url in urls:
+                self._entries[url] = status_code
+                self._entries.move_to_end(url)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
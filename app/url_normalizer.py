@@ -0,0 +1,41 @@
+from urllib.parse import urlsplit, urlunsplit, unquote
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """Returns the canonical form used to key, deduplicate and report URLs.
+
+    Percent-encoding is decoded once (as sitemap URLs always were), the scheme
+    and host are lower-cased, default ports and fragments are dropped and an
+    empty path becomes "/". Anything that does not parse is returned stripped.
+    """
+    return canonical_url(unquote(url))
+
+
+def canonical_url(url):
+    """Like normalize_url, but keeps percent-encoding as it is.
+
+    Used as the key of URLs that are fetched as given (redirect targets), where
+    decoding would change the request: %2F, %26 or %23 mean something else
+    once decoded.
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    userinfo = parts.netloc.rpartition("@")[0]
+    netloc = f"{userinfo}@{host}" if userinfo else host
+
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
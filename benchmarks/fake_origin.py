@@ -0,0 +1,286 @@
+"""Local stand-in for a sitemap host and its pages, for benchmarks.
+
+Serves a synthetic sitemap tree (root index -> `fanout` child sitemaps per
+level -> leaf sitemaps with `urls_per_sitemap` page URLs) and pages whose
+latency, status, redirects, timeouts and connection resets are drawn from
+configurable distributions. Every page's behaviour is derived from the seed
+and its path, so repeated runs see exactly the same site. Run standalone to
+point a manual `run.py` at it:
+
+    python benchmarks/fake_origin.py --port 8000 --depth 3 --fanout 10
+"""
+import argparse
+import gzip
+import math
+import random
+import socket
+import struct
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+REDIRECT_TARGETS = 10  # Pages redirect to one of a few shared landing pages
+
+
+def parse_latency(spec):
+    """Parses 'fixed:MS', 'uniform:LO,HI' or 'lognormal:MEDIAN,SIGMA' (milliseconds) into a sampler."""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0] / 1000
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values) / 1000
+    if kind == "lognormal" and len(values) == 2:
+        mu, sigma = math.log(values[0]), values[1]
+        return lambda rng: rng.lognormvariate(mu, sigma) / 1000
+    raise ValueError(f"invalid latency distribution '{spec}'")
+
+
+def parse_status_mix(spec):
+    """Parses '200:0.95,404:0.03,500:0.02' into normalized (status, weight) pairs."""
+    pairs = []
+    for part in spec.split(","):
+        status, _, weight = part.partition(":")
+        pairs.append((int(status), float(weight or 1)))
+    total = sum(weight for _, weight in pairs)
+    return [(status, weight / total) for status, weight in pairs]
+
+
+class SiteSpec:
+    """Shape of the synthetic site and how its pages behave."""
+    def __init__(self, depth=3, fanout=10, urls_per_sitemap=100, gzip_leaves=False, sitemap_naming=True,
+                 latency="fixed:5", status_mix="200:1", redirect_rate=0.0, timeout_rate=0.0, reset_rate=0.0,
+                 hang_seconds=5.0, page_size=2048, seed=0):
+        self.depth = depth  # Sitemap levels including the root (1 = root lists the pages)
+        self.fanout = fanout
+        self.urls_per_sitemap = urls_per_sitemap
+        self.gzip_leaves = gzip_leaves
+        # False names child sitemaps without "_sitemap", which the crawler then checks as pages
+        self.sitemap_naming = sitemap_naming
+        self.latency = latency
+        self.status_mix = status_mix
+        self.redirect_rate = redirect_rate
+        self.timeout_rate = timeout_rate
+        self.reset_rate = reset_rate
+        self.hang_seconds = hang_seconds
+        self.page_size = page_size
+        self.seed = seed
+
+    @property
+    def leaf_count(self):
+        return self.fanout ** (self.depth - 1)
+
+    @property
+    def page_count(self):
+        return self.leaf_count * self.urls_per_sitemap
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class FakeOrigin:
+    """Serves a SiteSpec on 127.0.0.1 from a background thread."""
+    def __init__(self, spec, port=0):
+        self.spec = spec
+        self._sample_latency = parse_latency(spec.latency)
+        self._status_mix = parse_status_mix(spec.status_mix)
+        self._latencies = []
+        self._latencies_lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), _Handler)
+        self._server.origin = self
+        self.base_url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-origin", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def root_url(self):
+        return f"{self.base_url}/root_sitemap.xml"
+
+    def page_urls(self):
+        return page_urls(self.base_url, self.spec)
+
+    def take_latencies(self):
+        """Returns and resets the server-side handling times (seconds) of page requests."""
+        with self._latencies_lock:
+            latencies, self._latencies = self._latencies, []
+        return latencies
+
+    # --- Documents ---
+
+    def sitemap_name(self, level, index):
+        name = f"l{level}_{index}_sitemap.xml" if self.spec.sitemap_naming else f"l{level}-{index}.xml"
+        if level == self.spec.depth - 1 and self.spec.gzip_leaves:
+            name += ".gz"
+        return name
+
+    def sitemap_body(self, level, index):
+        if level < self.spec.depth - 1:
+            children = range(index * self.spec.fanout, (index + 1) * self.spec.fanout)
+            locs = [f"{self.base_url}/sitemaps/{self.sitemap_name(level + 1, child)}" for child in children]
+            body = _document("sitemapindex", "sitemap", locs)
+        else:
+            locs = [f"{self.base_url}/pages/{index}/{k}" for k in range(self.spec.urls_per_sitemap)]
+            body = _document("urlset", "url", locs)
+        if self.spec.gzip_leaves and level == self.spec.depth - 1:
+            return gzip.compress(body, compresslevel=1)
+        return body
+
+    def page_behaviour(self, path):
+        """Returns (latency seconds, action, status) for a page path, the same on every run."""
+        rng = random.Random(f"{self.spec.seed}:{path}")
+        latency = self._sample_latency(rng)
+        roll = rng.random()
+        for action, rate in (("reset", self.spec.reset_rate), ("timeout", self.spec.timeout_rate),
+                             ("redirect", self.spec.redirect_rate)):
+            if roll < rate:
+                return latency, action, None
+            roll -= rate
+        roll = rng.random()
+        for status, weight in self._status_mix:
+            if roll < weight:
+                return latency, "respond", status
+            roll -= weight
+        return latency, "respond", self._status_mix[-1][0]
+
+    def record_latency(self, seconds):
+        with self._latencies_lock:
+            self._latencies.append(seconds)
+
+
+def page_urls(base_url, spec):
+    """Yields every page URL listed by the tree, leaf by leaf."""
+    for leaf in range(spec.leaf_count):
+        for k in range(spec.urls_per_sitemap):
+            yield f"{base_url}/pages/{leaf}/{k}"
+
+
+def _document(root_tag, entry_tag, locs):
+    entries = "".join(f"<{entry_tag}><loc>{loc}</loc><lastmod>2024-01-01</lastmod></{entry_tag}>" for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><{root_tag} xmlns="{NS}">{entries}</{root_tag}>'.encode()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle's algorithm the body would
+    # wait for the client's delayed ACK (~40 ms) on every keep-alive GET
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        origin = self.server.origin
+        path = self.path
+        if path == "/root_sitemap.xml":
+            return self._send(200, origin.sitemap_body(0, 0), "application/xml")
+        if path.startswith("/sitemaps/"):
+            return self._send_sitemap(origin, path[len("/sitemaps/"):])
+        if path.startswith("/landing/"):
+            return self._send(200, b"x" * origin.spec.page_size, "text/html")
+        if path.startswith("/pages/"):
+            return self._send_page(origin, path)
+        self._send(404)
+
+    def _send_sitemap(self, origin, name):
+        # l<level>_<index>_sitemap.xml[.gz] or l<level>-<index>.xml[.gz]
+        try:
+            level, index = name.split(".")[0][1:].replace("-", "_").split("_")[:2]
+            level, index = int(level), int(index)
+        except ValueError:
+            return self._send(404)
+        if name != origin.sitemap_name(level, index):
+            return self._send(404)
+        content_type = "application/x-gzip" if name.endswith(".gz") else "application/xml"
+        self._send(200, origin.sitemap_body(level, index), content_type)
+
+    def _send_page(self, origin, path):
+        started = time.perf_counter()
+        latency, action, status = origin.page_behaviour(path)
+        if action == "reset":
+            # SO_LINGER 0 turns the close into a TCP reset
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.close_connection = True
+            self.connection.close()
+            return
+        if action == "timeout":
+            time.sleep(origin.spec.hang_seconds)
+            self.close_connection = True
+            return
+        time.sleep(latency)
+        if action == "redirect":
+            target = f"{origin.base_url}/landing/{zlib.crc32(path.encode()) % REDIRECT_TARGETS}"
+            self._send(301, headers=[("Location", target)])
+        else:
+            self._send(status, b"x" * origin.spec.page_size if status == 200 else b"", "text/html")
+        origin.record_latency(time.perf_counter() - started)
+
+    def _send(self, status, body=b"", content_type=None, headers=()):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+def add_site_arguments(parser):
+    """Adds the SiteSpec options to an argparse parser."""
+    group = parser.add_argument_group("synthetic site")
+    group.add_argument("--depth", type=int, default=3, help="Sitemap levels including the root")
+    group.add_argument("--fanout", type=int, default=10, help="Child sitemaps per index sitemap")
+    group.add_argument("--urls-per-sitemap", type=int, default=100)
+    group.add_argument("--gzip", action="store_true", dest="gzip_leaves", help="Serve leaf sitemaps gzipped")
+    group.add_argument("--plain-sitemap-names", action="store_false", dest="sitemap_naming",
+                       help="Name child sitemaps without '_sitemap'")
+    group.add_argument("--latency", default="fixed:5",
+                       help="Page latency in ms: fixed:MS, uniform:LO,HI or lognormal:MEDIAN,SIGMA")
+    group.add_argument("--status-mix", default="200:1", help="Weighted page statuses, e.g. 200:0.95,404:0.05")
+    group.add_argument("--redirect-rate", type=float, default=0.0)
+    group.add_argument("--timeout-rate", type=float, default=0.0, help="Pages that never answer")
+    group.add_argument("--reset-rate", type=float, default=0.0, help="Pages that reset the connection")
+    group.add_argument("--hang-seconds", type=float, default=5.0, help="How long timing-out pages hang")
+    group.add_argument("--page-size", type=int, default=2048)
+    group.add_argument("--seed", type=int, default=0)
+
+
+def spec_from_args(args):
+    return SiteSpec(**{name: getattr(args, name) for name in SiteSpec().as_dict()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+    spec = spec_from_args(args)
+    origin = FakeOrigin(spec, port=args.port).start()
+    print(f"Serving {spec.page_count:,} pages; root sitemap: {origin.root_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        origin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""Throughput of the crawl, check and report stages against a local fake origin.
+
+Starts benchmarks/fake_origin.py in this process and runs each stage (and the
+full SitemapCheckerApp.run pipeline) in a fresh child process, so peak RSS is
+per stage and the server does not compete with the checker for the GIL.
+Results are written as JSON for comparing commits. Run from the repository root:
+
+    python benchmarks/pipeline_benchmark.py --depth 3 --fanout 10 --urls-per-sitemap 100 \\
+        --latency lognormal:20,0.5 --status-mix 200:0.95,404:0.05 --output bench.json
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_origin import FakeOrigin, SiteSpec, add_site_arguments, page_urls, spec_from_args
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ("crawl", "check", "report", "pipeline")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class _LatencyRecorder:
+    """Host controller stand-in that never limits and records each request's latency."""
+    def __init__(self):
+        self.latencies = []
+
+    def try_acquire(self, host):
+        return 0
+
+    def cancel(self, host):
+        pass
+
+    def release(self, host, status_code, error, latency, retry_after=None):
+        self.latencies.append(latency)
+
+    async def acquire_async(self, host):
+        pass
+
+    async def release_async(self, host, status_code, error, latency, retry_after=None):
+        self.latencies.append(latency)
+
+    def log_summary(self):
+        pass
+
+
+class _CountingReports:
+    """Report manager stand-in for the check stage: counts statuses, writes nothing."""
+    def __init__(self):
+        self.status_counts = Counter()
+
+    def append_check_result(self, url, status_code, node_id, reason=None, lastmod=None, cached=None, headers=None,
+                            latency=None):
+        self.status_counts[status_code] += 1
+
+
+def _crawl_stage(root_url, spec, options):
+    from app.http_session import SessionPool
+    from app.sitemap_crawler import SitemapCrawler
+
+    crawler = SitemapCrawler(SessionPool(), num_workers=options["crawl_workers"])
+    started = time.perf_counter()
+    urls = sum(1 for _ in crawler.stream(root_url))
+    return {"urls": urls, "seconds": time.perf_counter() - started, "sitemaps": len(crawler.tree)}
+
+
+def _check_stage(root_url, spec, options):
+    from app.request_method import RequestMethodSelector
+    from app.retry import RetryPolicy
+
+    base_url = root_url.rsplit("/", 1)[0]
+    items = [(url, 0, None, None) for url in page_urls(base_url, SiteSpec(**spec))]
+    recorder = _LatencyRecorder()
+    reports = _CountingReports()
+    retry_policy = RetryPolicy(timeouts=(options["check_timeout"],), delays=())
+    method_selector = RequestMethodSelector(head_first=options["head_first"])
+
+    started = time.perf_counter()
+    if options["engine"] == "async":
+        from app.async_url_checker import AsyncUrlChecker
+        AsyncUrlChecker.check_urls(
+            items, report_manager=reports, max_in_flight=options["max_in_flight"],
+            retry_policy=retry_policy, host_controller=recorder, method_selector=method_selector
+        )
+    else:
+        from app.http_session import SessionPool
+        from app.url_checker import UrlChecker
+        UrlChecker.check_urls(
+            items, report_manager=reports, session_pool=SessionPool(pool_maxsize=options["workers"]),
+            num_workers=options["workers"], retry_policy=retry_policy, host_controller=recorder,
+            method_selector=method_selector
+        )
+    return {
+        "urls": len(items),
+        "seconds": time.perf_counter() - started,
+        "latencies": recorder.latencies,
+        "status_counts": dict(reports.status_counts),
+    }
+
+
+def _report_stage(root_url, spec, options):
+    from app.config import Config
+    from app.report_manager import ReportManager
+    from app.sitemap_tree import SitemapTree
+
+    site = SiteSpec(**spec)
+    tree = SitemapTree()
+    root_id = tree.add(root_url)
+    leaf_ids = [tree.add(f"{root_url}#leaf{leaf}", root_id) for leaf in range(site.leaf_count)]
+    report_manager = ReportManager(Config(root_url, write_batch_size=options["write_batch_size"]))
+    report_manager.set_sitemap_tree(tree)
+    report_manager.load_checked_urls()
+    report_manager.start_writer()
+
+    started = time.perf_counter()
+    urls = 0
+    for url in page_urls(root_url.rsplit("/", 1)[0], site):
+        leaf = int(url.rsplit("/", 2)[1])
+        report_manager.append_check_result(url, 200, leaf_ids[leaf])
+        urls += 1
+    report_manager.close()
+    report_manager.set_max_depth(tree.max_depth)
+    report_manager.export_check_reports()
+    seconds = time.perf_counter() - started
+    report_manager.close_store()
+    return {
+        "urls": urls,
+        "seconds": seconds,
+        "report_write_seconds": report_manager.write_seconds + report_manager.export_seconds,
+    }
+
+
+def _pipeline_stage(root_url, spec, options):
+    from app.app import SitemapCheckerApp
+
+    app = SitemapCheckerApp(
+        root_url,
+        engine=options["engine"],
+        num_workers=options["workers"],
+        max_in_flight=options["max_in_flight"],
+        crawl_workers=options["crawl_workers"],
+        write_batch_size=options["write_batch_size"],
+        retry_timeouts=(options["check_timeout"],),
+        retry_delays=(),
+        head_first=options["head_first"]
+    )
+    started = time.perf_counter()
+    app.run()
+    seconds = time.perf_counter() - started
+    status_counts = Counter()
+    with open(app.config.url_checks_csv, encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            status_counts[int(line.rsplit(",", 1)[1])] += 1
+    return {
+        "urls": sum(status_counts.values()),
+        "seconds": seconds,
+        "report_write_seconds": app.report_manager.write_seconds + app.report_manager.export_seconds,
+        "status_counts": dict(status_counts),
+    }
+
+
+def run_stage(stage, root_url, spec, options):
+    """Child process entry point: runs one stage in a scratch directory."""
+    stage_function = {
+        "crawl": _crawl_stage, "check": _check_stage, "report": _report_stage, "pipeline": _pipeline_stage
+    }[stage]
+    with tempfile.TemporaryDirectory() as workdir, open(os.devnull, "w") as devnull:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            with contextlib.ExitStack() as quiet:
+                if not options["verbose"]:
+                    quiet.enter_context(contextlib.redirect_stdout(devnull))
+                    quiet.enter_context(contextlib.redirect_stderr(devnull))
+                result = stage_function(root_url, spec, options)
+        finally:
+            os.chdir(cwd)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def summarize(stage, engine, result, origin_latencies):
+    latencies = result.pop("latencies", None)
+    summary = {
+        "stage": stage,
+        "engine": engine,
+        "urls": result["urls"],
+        "seconds": round(result["seconds"], 3),
+        "urls_per_sec": round(result["urls"] / result["seconds"], 1) if result["seconds"] else None,
+        "latency_p50_ms": _ms(percentile(latencies, 0.50)),
+        "latency_p99_ms": _ms(percentile(latencies, 0.99)),
+        "origin_latency_p50_ms": _ms(percentile(origin_latencies, 0.50)),
+        "origin_latency_p99_ms": _ms(percentile(origin_latencies, 0.99)),
+        "peak_rss_mb": round(result["peak_rss_mb"], 1) if result["peak_rss_mb"] is not None else None,
+        "report_write_seconds": _round(result.get("report_write_seconds"), 3),
+    }
+    for key, value in result.items():
+        summary.setdefault(key, value)
+    return summary
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _round(value, digits):
+    return round(value, digits) if value is not None else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--engines", default="threaded,async", help="Check engines for the check and pipeline stages")
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--max-in-flight", type=int, default=500)
+    parser.add_argument("--crawl-workers", type=int, default=8)
+    parser.add_argument("--write-batch-size", type=int, default=500)
+    parser.add_argument("--check-timeout", type=int, default=2, help="Request timeout; no retries")
+    parser.add_argument("--head", action="store_true", help="Check pages with HEAD instead of a streamed GET")
+    parser.add_argument("--output", help="Write the JSON results to this file as well")
+    parser.add_argument("--verbose", action="store_true", help="Show the stages' own output")
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    options = {
+        "workers": args.workers, "max_in_flight": args.max_in_flight, "crawl_workers": args.crawl_workers,
+        "write_batch_size": args.write_batch_size, "check_timeout": args.check_timeout, "verbose": args.verbose,
+        "head_first": args.head,
+    }
+    runs = []
+    for stage in args.stages.split(","):
+        if stage not in STAGES:
+            parser.error(f"unknown stage '{stage}'")
+        engines = args.engines.split(",") if stage in ("check", "pipeline") else [None]
+        runs.extend((stage, engine) for engine in engines)
+
+    origin = FakeOrigin(spec).start()
+    # Spawned children start clean, so each stage's peak RSS is its own
+    context = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        for stage, engine in runs:
+            print(f"Running {stage}" + (f" ({engine})" if engine else "") + "...", file=sys.stderr)
+            origin.take_latencies()
+            pool = context.Pool(1)
+            try:
+                result = pool.apply(run_stage, (stage, origin.root_url, spec.as_dict(), dict(options, engine=engine)))
+            finally:
+                pool.close()
+                pool.join()
+            results.append(summarize(stage, engine, result, origin.take_latencies()))
+    finally:
+        origin.stop()
+
+    report = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "site": dict(spec.as_dict(), page_count=spec.page_count),
+        "options": options,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
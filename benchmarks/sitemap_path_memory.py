@@ -0,0 +1,89 @@
+"""Memory per page URL: a sitemap path list per URL vs. a SitemapTree node id.
+
+Builds a synthetic tree (1 root -> 50 index sitemaps -> 20 leaf sitemaps each,
+1,000 page URLs per leaf = 1M URLs) and measures both representations with
+tracemalloc. Run from the repository root:
+
+    python benchmarks/sitemap_path_memory.py [--urls-per-sitemap N]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.sitemap_tree import SitemapTree
+
+BASE = "https://www.example.com"
+
+
+def leaf_sitemaps(indexes, leaves):
+    root = f"{BASE}/root_sitemap.xml"
+    for i in range(indexes):
+        index = f"{BASE}/sitemaps/index_{i}_sitemap.xml"
+        for j in range(leaves):
+            yield root, index, f"{BASE}/sitemaps/{i}/leaf_{j}_sitemap.xml"
+
+
+def page_urls(leaf, count):
+    prefix = leaf.rsplit("/", 1)[0].replace("/sitemaps/", "/pages/")
+    return [f"{prefix}/page-{k}.html" for k in range(count)]
+
+
+def measure(build):
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current
+
+
+def build_path_lists(indexes, leaves, per_sitemap):
+    """Old layout: (url, list(path)) per page URL."""
+    pages = []
+    for root, index, leaf in leaf_sitemaps(indexes, leaves):
+        path = [root, index, leaf]
+        for url in page_urls(leaf, per_sitemap):
+            pages.append((url, list(path)))
+    return pages
+
+
+def build_node_ids(indexes, leaves, per_sitemap):
+    """New layout: (url, node id) per page URL plus one shared SitemapTree."""
+    tree = SitemapTree()
+    pages = []
+    for root, index, leaf in leaf_sitemaps(indexes, leaves):
+        root_id = tree.node_id(root)
+        if root_id is None:
+            root_id = tree.add(root)
+        index_id = tree.node_id(index)
+        if index_id is None:
+            index_id = tree.add(index, root_id)
+        leaf_id = tree.add(leaf, index_id)
+        for url in page_urls(leaf, per_sitemap):
+            pages.append((url, leaf_id))
+    return tree, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--indexes", type=int, default=50)
+    parser.add_argument("--leaves", type=int, default=20)
+    parser.add_argument("--urls-per-sitemap", type=int, default=1000)
+    args = parser.parse_args()
+
+    total = args.indexes * args.leaves * args.urls_per_sitemap
+    url_bytes = measure(lambda: [u for _, _, leaf in leaf_sitemaps(args.indexes, args.leaves)
+                                 for u in page_urls(leaf, args.urls_per_sitemap)])[1]
+
+    print(f"Synthetic tree: {total:,} page URLs, depth 3")
+    print(f"  page URL strings alone:   {url_bytes / total:7.1f} bytes/URL")
+    for label, build in (("path list per URL", build_path_lists), ("SitemapTree node id", build_node_ids)):
+        data, size = measure(lambda: build(args.indexes, args.leaves, args.urls_per_sitemap))
+        print(f"  {label + ':':25} {size / total:7.1f} bytes/URL ({size / 2**20:,.0f} MiB)")
+        del data
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,12 @@
 import os
 import argparse
 from app.app import SitemapCheckerApp
+from app.config import Config
+from app.multi_root import MultiRootApp, read_sitemap_urls, root_dir_name
+from app.retry import ERROR_KINDS
+from app.sampling import SampleScan
+from app.sharding import ShardLauncher
+from app.shard_merger import ShardMerger
 
 
 def print_usage_instructions():
@@ -18,22 +24,68 @@ def print_usage_instructions():
     print("\nOPTIONS:")
     print("  -s, --start   Required flag to begin the URL checking process")
     print("  -r, --resume  Continue from previous check instead of starting fresh")
+    print("  --revalidate-sitemaps  On resume, also re-fetch recorded sitemaps that changed")
+    print("  --engine      Check engine: 'threaded' (default) or 'async'")
+    print("  --workers     Number of worker threads for the threaded engine")
+    print("  --max-in-flight  Concurrent requests for the async engine")
+    print("  --pool-maxsize   Pooled keep-alive connections per host")
+    print("  --no-keep-alive  Close the connection after every request")
+    print("  --retry-timeouts Request timeout per attempt, e.g. 10,15,25,40")
+    print("  --retry-delays   Backoff before each retry, e.g. 5,10,15")
+    print("  --retry-statuses HTTP status codes to retry, e.g. 429,503")
+    print("  --retry-errors   Request errors to retry: connection,timeout,tls,other (default connection,timeout)")
+    print("  --write-batch-size / --write-flush-interval / --fsync")
+    print("                   Report durability: at most one batch is lost on a crash")
+    print("  --incremental    Skip unchanged, recently healthy URLs; conditional requests for the rest")
+    print("  --cache-ttl      Seconds a healthy cached result stays valid (default 86400)")
+    print("  --adaptive       Tune per-host concurrency automatically (backs off on 429/503/timeouts)")
+    print("  --host-max-concurrency  Upper bound for the per-host concurrency (default 64)")
+    print("  --host-max-rps   Cap requests per second per host")
+    print("  --circuit-threshold  Consecutive connection failures before a host's URLs fail fast (0 = off)")
+    print("  --circuit-probe-interval  Seconds between recovery probes of a failing host (default 30)")
+    print("  --dns-cache-ttl  Seconds resolved host names are reused (0 = off, default 300)")
+    print("  --head           Check with HEAD; GET only when HEAD fails or the host mishandles it")
+    print("  --get-only-hosts Hosts that never get HEAD, e.g. shop.example.com,cdn.example.com")
+    print("  --drain-bytes    Body bytes read before a GET connection is closed instead (default 65536)")
+    print("  --sample N       Quick scan: check N random page URLs per sitemap and estimate dead-link rates")
+    print("  --sample-expand R  Sample R more rounds in sitemaps whose sample found dead links")
+    print("  --sample-confidence  Confidence level of the estimates (default 0.95)")
+    print("  --sample-seed    Random seed, to repeat the same sample")
+    print("  --metrics-port   Serve live Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    print("  --metrics-file   Rewrite a JSON metrics snapshot every few seconds")
+    print("  --no-check-log   Do not write per-request events to log/checks.jsonl")
+    print("  --shard i/N      Check only shard i (0-based) of N; reports go to reports/shard_i_of_N/")
+    print("  --processes [N]  Run N shards as local processes (default: one per CPU core) and merge them")
+    print("  --merge-shards N Combine the reports of N shard runs into reports/")
+    print("  (several URLs in sitemap.txt: every root is checked concurrently, reports in reports/<root>/)")
 
     print("\nPREREQUISITES:")
     # Check sitemap.txt
+    sitemap_urls = []
     if os.path.exists("sitemap.txt"):
-        with open("sitemap.txt", "r", encoding="utf-8") as f:
-            line = f.readline().strip()
-            if line:
-                print(f"  ✓ sitemap.txt found with URL: {line}")
-            else:
-                print("  ✗ sitemap.txt exists but is empty - please add a sitemap URL")
+        sitemap_urls = read_sitemap_urls("sitemap.txt")
+        if len(sitemap_urls) == 1:
+            print(f"  ✓ sitemap.txt found with URL: {sitemap_urls[0]}")
+        elif sitemap_urls:
+            print(f"  ✓ sitemap.txt found with {len(sitemap_urls)} sitemap roots, checked together:")
+            for url in sitemap_urls:
+                print(f"      {url}")
+        else:
+            print("  ✗ sitemap.txt exists but is empty - please add a sitemap URL")
     else:
         print("  ✗ sitemap.txt not found - please create it from sitemap.txt.example")
 
     # Check resume possibility
     print("\nRESUME STATUS:")
-    if SitemapCheckerApp.can_resume():
+    if len(sitemap_urls) > 1:
+        resume_info = MultiRootApp.get_resume_info(sitemap_urls)
+        if resume_info:
+            print(f"  ✓ Previous run found for {len(resume_info)} of {len(sitemap_urls)} roots "
+                  f"with {sum(resume_info.values())} URLs already checked")
+            print("    Use '--start --resume' or '-s -r' to continue from where you left off")
+        else:
+            print("  ○ No previous run found - '--resume' flag will have no effect")
+    elif SitemapCheckerApp.can_resume():
         count = SitemapCheckerApp.get_resume_info()
         if count is not None:
             print(f"  ✓ Previous run found with {count} URLs already checked")
@@ -47,9 +99,49 @@ def print_usage_instructions():
     print("  python run.py --start              # Fresh start")
     print("  python run.py --start --resume     # Continue previous check")
     print("  python run.py -s -r                # Same as above (short form)")
+    print("  python run.py -s --engine async --max-in-flight 2000")
+    print("  python run.py -s --incremental     # Nightly run re-checking only changed URLs")
+    print("  python run.py -s --head            # Status lines only, no page bodies")
+    print("  python run.py -s --sample 20       # Quick health estimate after a deploy")
+    print("  python run.py -s --shard 0/4       # First of four shards, e.g. on one of four nodes")
+    print("  python run.py --merge-shards 4     # Merge reports/shard_*_of_4/ into reports/")
+    print("  python run.py -s --processes       # All CPU cores on this machine")
     print("\n" + "=" * 60 + "\n")
 
 
+def _shard(value):
+    """Parses 'i/N' (0 <= i < N) for argparse."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got '{value}'")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}, got '{value}'")
+    return index, count
+
+
+def _int_list(value):
+    """Parses a comma-separated list of integers for argparse."""
+    try:
+        return tuple(int(part) for part in value.split(",") if part.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got '{value}'")
+
+
+def _error_kinds(value):
+    """Parses a comma-separated list of RetryPolicy error kinds for argparse."""
+    kinds = tuple(part.strip().lower() for part in value.split(",") if part.strip())
+    unknown = [kind for kind in kinds if kind not in ERROR_KINDS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown error kind(s) {', '.join(unknown)}; use {','.join(ERROR_KINDS)}")
+    return kinds
+
+
+def _host_list(value):
+    """Parses a comma-separated list of host names for argparse."""
+    return tuple(part.strip().lower() for part in value.split(",") if part.strip())
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Check URLs from sitemap for dead links",
@@ -65,8 +157,202 @@ if __name__ == "__main__":
         action="store_true",
         help="Resume from previous check instead of starting fresh"
     )
+    parser.add_argument(
+        "--revalidate-sitemaps",
+        action="store_true",
+        default=None,
+        help="On resume, fetch recorded sitemaps again if their ETag/Last-Modified changed"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threaded", "async"],
+        help="Check engine to use (default: threaded)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        dest="num_workers",
+        help="Number of worker threads for the threaded engine"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="Maximum concurrent requests for the async engine"
+    )
+    parser.add_argument(
+        "--pool-maxsize",
+        type=int,
+        help="Pooled keep-alive connections per host"
+    )
+    parser.add_argument(
+        "--no-keep-alive",
+        action="store_false",
+        dest="keep_alive",
+        default=None,
+        help="Close the connection after every request"
+    )
+    parser.add_argument(
+        "--retry-timeouts",
+        type=_int_list,
+        help="Comma-separated request timeout in seconds for each attempt"
+    )
+    parser.add_argument(
+        "--retry-delays",
+        type=_int_list,
+        help="Comma-separated wait in seconds before each retry"
+    )
+    parser.add_argument(
+        "--retry-statuses",
+        type=_int_list,
+        help="Comma-separated HTTP status codes that are retried"
+    )
+    parser.add_argument(
+        "--retry-errors",
+        type=_error_kinds,
+        help="Comma-separated kinds of request errors that are retried (connection, timeout, tls, other)"
+    )
+    parser.add_argument(
+        "--write-batch-size",
+        type=int,
+        help="Rows written to the reports per batch"
+    )
+    parser.add_argument(
+        "--write-flush-interval",
+        type=float,
+        help="Maximum seconds between report flushes"
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        dest="write_fsync",
+        default=None,
+        help="fsync the run state after every committed batch"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=None,
+        help="Only re-check URLs that changed or were not recently healthy"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        help="Seconds a healthy cached result stays valid in incremental mode"
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        dest="adaptive_concurrency",
+        default=None,
+        help="Adapt per-host concurrency to latency, errors and Retry-After"
+    )
+    parser.add_argument(
+        "--host-max-concurrency",
+        type=int,
+        help="Upper bound for adaptive per-host concurrency"
+    )
+    parser.add_argument(
+        "--host-max-rps",
+        type=float,
+        help="Maximum requests per second per host"
+    )
+    parser.add_argument(
+        "--circuit-threshold",
+        type=int,
+        dest="circuit_failure_threshold",
+        help="Consecutive connection failures that open a host's circuit (0 disables it)"
+    )
+    parser.add_argument(
+        "--circuit-probe-interval",
+        type=float,
+        help="Seconds between half-open probes of an open circuit"
+    )
+    parser.add_argument(
+        "--dns-cache-ttl",
+        type=int,
+        help="Seconds a resolved host name is reused (0 disables the DNS cache)"
+    )
+    parser.add_argument(
+        "--head",
+        action="store_true",
+        dest="head_first",
+        default=None,
+        help="Check URLs with HEAD and fall back to GET on errors or for hosts that mishandle HEAD"
+    )
+    parser.add_argument(
+        "--get-only-hosts",
+        type=_host_list,
+        help="Comma-separated hosts that are always checked with GET"
+    )
+    parser.add_argument(
+        "--drain-bytes",
+        type=int,
+        help="Response body bytes read so the connection can be reused; longer bodies close it"
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        dest="sample_size",
+        metavar="N",
+        help="Quick scan: check N random page URLs per sitemap and report estimated dead-link rates"
+    )
+    parser.add_argument(
+        "--sample-expand",
+        type=int,
+        dest="sample_expand_rounds",
+        metavar="R",
+        help="Extra sampling rounds for sitemaps whose sample found dead links"
+    )
+    parser.add_argument(
+        "--sample-confidence",
+        type=float,
+        help="Confidence level of the estimated dead-link rates (default 0.95)"
+    )
+    parser.add_argument(
+        "--sample-seed",
+        type=int,
+        help="Random seed for the sample"
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve live metrics in Prometheus text format on this port"
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="Periodically rewrite a JSON metrics snapshot at this path"
+    )
+    parser.add_argument(
+        "--no-check-log",
+        action="store_false",
+        dest="check_log",
+        default=None,
+        help="Do not log every check attempt to log/checks.jsonl"
+    )
+    parser.add_argument(
+        "--shard",
+        type=_shard,
+        help="Check only shard i of N (0-based), e.g. 2/8"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        nargs="?",
+        const=0,
+        help="Run the shards as local processes (default: one per CPU core) and merge the reports"
+    )
+    parser.add_argument(
+        "--merge-shards",
+        type=int,
+        metavar="N",
+        help="Merge the reports of N shard runs into reports/"
+    )
     args = parser.parse_args()
 
+    if args.merge_shards:
+        merged = ShardMerger(Config(None), args.merge_shards).merge()
+        exit(0 if merged else 1)
+
     # If --start flag is not provided, show usage instructions
     if not args.start:
         print_usage_instructions()
@@ -74,18 +360,44 @@ if __name__ == "__main__":
 
     # Validate sitemap.txt
     if os.path.exists("sitemap.txt"):
-        with open("sitemap.txt", "r", encoding="utf-8") as f:
-            line = f.readline().strip()
-            if line:
-                sitemap_url = line
-            else:
-                print("Error: sitemap.txt is empty.")
-                print("Please add your sitemap URL to sitemap.txt")
-                exit(1)
+        sitemap_urls = read_sitemap_urls("sitemap.txt")
+        if not sitemap_urls:
+            print("Error: sitemap.txt is empty.")
+            print("Please add your sitemap URL to sitemap.txt")
+            exit(1)
+        sitemap_url = sitemap_urls[0]
     else:
         print("Error: sitemap.txt not found.")
         print("Please create sitemap.txt from sitemap.txt.example and add your sitemap URL")
         exit(1)
 
-    app = SitemapCheckerApp(sitemap_url, resume=args.resume)
+    # Only forward options given on the command line; Config holds the defaults
+    config_options = {
+        key: value for key, value in vars(args).items()
+        if key not in ("start", "resume", "shard", "processes", "merge_shards") and value is not None
+    }
+
+    if args.sample_size:
+        # Reports go to reports/sample/ (per root with several roots); a full run's state is kept
+        for url in sitemap_urls:
+            root_name = root_dir_name(url) if len(sitemap_urls) > 1 else None
+            SampleScan(url, root_name=root_name, **config_options).run()
+        exit(0)
+
+    if len(sitemap_urls) > 1:
+        if args.shard or args.processes is not None:
+            print("Error: --shard and --processes check a single sitemap root.")
+            print("Keep one sitemap URL in sitemap.txt to split its check across shards.")
+            exit(1)
+        app = MultiRootApp(sitemap_urls, resume=args.resume, **config_options)
+        exit(0 if app.run() else 1)
+
+    if args.processes is not None:
+        launcher = ShardLauncher(sitemap_url, processes=args.processes, resume=args.resume, **config_options)
+        exit(0 if launcher.run() else 1)
+
+    if args.shard:
+        config_options["shard_index"], config_options["shard_count"] = args.shard
+
+    app = SitemapCheckerApp(sitemap_url, resume=args.resume, **config_options)
     app.run()
\ No newline at end of file